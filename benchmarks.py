@@ -0,0 +1,108 @@
+"""
+Rough benchmarks for the local data structures, run with `python3 benchmarks.py`.
+They use a synthetic corpus the size of jservice's, so they don't need the network.
+"""
+import os
+import random
+import string
+import tempfile
+import time
+import asyncio
+import tracemalloc
+
+from cogs.cluestore import ClueStore
+from cogs.boards import generate_board
+from cogs.members import MemberCache
+
+CLUE_AMOUNT = 176778
+CATEGORY_AMOUNT = 23411
+
+
+def random_words(amount):
+    return ' '.join(''.join(random.choices(string.ascii_lowercase, k=random.randint(3, 9)))
+                    for _ in range(amount))
+
+
+def synthetic_corpus(amount=CLUE_AMOUNT):
+    random.seed(0)
+    clues = []
+    for clue_id in range(1, amount + 1):
+        category_id = random.randint(1, CATEGORY_AMOUNT)
+        clues.append({'id': clue_id, 'answer': random_words(2), 'question': random_words(15),
+                      'value': random.choice([None, 100, 200, 300, 400, 500, 600, 800, 1000]),
+                      'airdate': f'{random.randint(1984, 2015)}-0{random.randint(1, 9)}-1{random.randint(0, 9)}',
+                      'category_id': category_id, 'game_id': 1, 'invalid_count': None,
+                      'category': {'id': category_id, 'title': random_words(2), 'clues_count': 5}})
+    return clues
+
+
+def timed(name, function, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    elapsed = time.perf_counter() - start
+    print(f'{name}: {elapsed / repeat * 1000:.3f}ms')
+    return result, elapsed
+
+
+def bench_clue_store(directory):
+    clues = synthetic_corpus()
+    store = ClueStore(os.path.join(directory, 'clues.db'))
+    _, elapsed = timed('ingest corpus', lambda: [store.ingest_clues(clues[i:i+5000])
+                                                 for i in range(0, len(clues), 5000)])
+    print(f'ingest throughput: {len(clues) / elapsed:.0f} clues/s')
+    timed('sample any clue', lambda: store.sample(), 1000)
+    timed('sample any value', lambda: store.sample(value=400), 1000)
+    timed('sample value and era', lambda: store.sample(value=400, min_date='1990-01-01',
+                                                       max_date='1999-12-31'), 1000)
+    timed('sample category', lambda: store.sample(category_id=random.randint(1, CATEGORY_AMOUNT)), 1000)
+    words = [clue['question'].split()[3] for clue in random.sample(clues, 100)]
+    timed('search word', lambda: store.search(random.choice(words)), 1000)
+    timed('search prefix', lambda: store.search(random.choice(words)[:3] + '*'), 100)
+    timed('search phrase', lambda: store.search('"{}"'.format(
+        ' '.join(random.choice(clues)['question'].split()[2:5]))), 1000)
+    return store
+
+
+def bench_boards(store):
+    boards, elapsed = timed('generate board', lambda: [generate_board(store) for _ in range(100)])
+    print(f'board throughput: {len(boards) / elapsed:.0f} boards/s')
+
+
+def bench_member_cache(amount=200000, size=10000):
+    """Memory of every member of a big guild in discord.py's cache against a bounded MemberCache."""
+    import discord
+    from discord.state import ConnectionState
+
+    def member_data(i):
+        return {'user': {'id': 10**17 + i, 'username': f'user{i}', 'discriminator': '0001',
+                         'avatar': random_words(1)}, 'roles': [], 'nick': None,
+                'joined_at': '2020-01-01T00:00:00+00:00', 'deaf': False, 'mute': False}
+
+    def measure(keep):
+        loop = asyncio.new_event_loop()
+        state = ConnectionState(dispatch=lambda *args: None, handlers={}, hooks={}, syncer=None,
+                                http=None, loop=loop, intents=discord.Intents.default())
+        guild = discord.Guild(data={'id': 1, 'name': 'guild', 'roles': [], 'members': []}, state=state)
+        tracemalloc.start()
+        for i in range(amount):
+            keep(guild, discord.Member(data=member_data(i), guild=guild, state=state))
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        loop.close()
+        return used
+
+    full = measure(lambda guild, member: guild._add_member(member))
+    cache = MemberCache(size)
+    bounded = measure(lambda guild, member: cache.remember(member))
+    print(f'member cache: {full / 2**20:.1f}MB for all {amount} members, '
+          f'{bounded / 2**20:.1f}MB keeping the last {size}')
+    guild = next(iter(cache.members.values())).guild
+    timed('member cache hit', lambda: cache.get(guild, 10**17 + amount - 1), 100000)
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        store = bench_clue_store(directory)
+        bench_boards(store)
+    bench_member_cache()
@@ -1,38 +1,154 @@
+import time
+started = time.perf_counter()
+
 import discord
 from discord.ext import commands
-import logging
+from cogs.logs import setup_logging
+from cogs.startup import StartupTimer, warm_up_cogs
+from cogs.members import member_cache_options
+from cogs.grading import start_executor
 
 import os
 import sys
+import asyncio
+import logging
 import traceback
+import multiprocessing
 
 initial_extensions = ['cogs.browser',
                       'cogs.game',
+                      'cogs.stats',
                       'cogs.owner',
                       'cogs.others',
                       'cogs.role',
-                      'cogs.autodelete']
+                      'cogs.autodelete',
+                      'cogs.monitoring']
 
 intents = discord.Intents.default()
 intents.members = True
-logging.basicConfig(filename='jeopardy.log', level=logging.INFO)
 prefix = ("t.", "T.")
-bot = commands.Bot(command_prefix=prefix, intents=intents)
 
-if __name__ == '__main__':
+
+def create_bot(sharded=False, shard_ids=None, shard_count=None):
+    """
+    A plain Bot, or an AutoShardedBot running shard_ids out of shard_count
+    shards. Leaving those as None runs every shard of the recommended amount.
+    """
+    timer = StartupTimer(started)
+    timer.phases.append(('imports', timer.since_start()))
+    if not sharded:
+        bot = commands.Bot(command_prefix=prefix, intents=intents, **member_cache_options())
+    else:
+        bot = commands.AutoShardedBot(command_prefix=prefix, intents=intents,
+                                      shard_ids=shard_ids, shard_count=shard_count,
+                                      **member_cache_options())
+    bot.startup = timer
+
     for extension in initial_extensions:
         try:
-            bot.load_extension(extension)
+            with timer.phase(f'load {extension}'):
+                bot.load_extension(extension)
         except Exception as e:
             print(f'Failed to load extension {extension}.', file=sys.stderr)
             traceback.print_exc()
+    login_start = time.perf_counter()
+
+    async def finish_startup():
+        await warm_up_cogs(bot, timer)
+        logging.info(timer.report())
+        print(timer.report())
+
+    @bot.event
+    async def on_ready():
+        """http://discordpy.readthedocs.io/en/rewrite/api.html#discord.on_ready"""
+
+        print(f'\n\nLogged in as: {bot.user.name} - {bot.user.id}\nVersion: {discord.__version__}\n')
+        if bot.shard_count:
+            print(f'Running shards {bot.shard_ids or "all"} of {bot.shard_count}')
+
+        print(f'Successfully logged in and booted...!')
+        # on_ready also fires after reconnecting, only the first one is startup
+        if 'login' not in dict(timer.phases):
+            timer.phases.append(('login', time.perf_counter() - login_start))
+            # nothing here is needed to answer commands, so don't hold up on_ready
+            asyncio.ensure_future(finish_startup())
+
+    close_bot = bot.close
+
+    async def close():
+        # the cogs release the jservice client in tasks the stopping loop doesn't get to
+        await close_bot()
+        client = getattr(bot, 'jservice_client', None)
+        if client is not None:
+            await client.close()
 
-@bot.event
-async def on_ready():
-    """http://discordpy.readthedocs.io/en/rewrite/api.html#discord.on_ready"""
+    bot.close = close
 
-    print(f'\n\nLogged in as: {bot.user.name} - {bot.user.id}\nVersion: {discord.__version__}\n')
-    
-    print(f'Successfully logged in and booted...!')
+    @bot.listen('on_command')
+    async def first_command(ctx):
+        bot.remove_listener(first_command, 'on_command')
+        logging.info(f'First command {time.perf_counter() - timer.started:.2f}s after starting',
+                     extra={'command': ctx.command.qualified_name})
 
-bot.run(os.environ['TOKEN'], bot=True, reconnect=True)
+    return bot
+
+
+def run_worker(worker=None, sharded=False, shard_ids=None, shard_count=None):
+    if worker is None:
+        setup_logging('jeopardy.log')
+    else:
+        # every process keeps its own log and metrics so they don't rotate over each other
+        setup_logging(f'jeopardy-{worker}.log')
+        os.environ.setdefault('METRICS_FILE', f'metrics-{worker}.prom')
+    start_executor()
+    bot = create_bot(sharded, shard_ids, shard_count)
+    bot.run(os.environ['TOKEN'], bot=True, reconnect=True)
+
+
+def split_shards(shard_count, workers):
+    """Contiguous shard ranges, as even as possible, one per worker."""
+    return [list(range(shard_count * i // workers, shard_count * (i+1) // workers))
+            for i in range(workers)]
+
+
+def launch(shard_count, workers):
+    """Runs every range of shards in its own process, restarting any that die."""
+    processes = {}
+    shard_ranges = split_shards(shard_count, workers)
+
+    def start(worker):
+        process = multiprocessing.Process(target=run_worker, name=f'jeopardy-{worker}',
+                                          args=(worker, True, shard_ranges[worker], shard_count))
+        process.start()
+        processes[worker] = process
+        print(f'Started worker {worker} (pid {process.pid}) with shards {shard_ranges[worker]}')
+
+    for worker in range(workers):
+        start(worker)
+    try:
+        while True:
+            time.sleep(5)
+            for worker, process in list(processes.items()):
+                if not process.is_alive():
+                    print(f'Worker {worker} exited with {process.exitcode}, restarting it',
+                          file=sys.stderr)
+                    start(worker)
+    except KeyboardInterrupt:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+
+
+if __name__ == '__main__':
+    shard_count = os.environ.get('SHARD_COUNT')
+    workers = int(os.environ.get('WORKERS', 1))
+    if shard_count is None:
+        run_worker()
+    elif shard_count == 'auto':
+        # discord.py asks for the recommended amount, so it can't be split between processes
+        run_worker(sharded=True)
+    elif workers <= 1:
+        run_worker(sharded=True, shard_count=int(shard_count))
+    else:
+        launch(int(shard_count), workers)
@@ -1,8 +1,9 @@
 import discord
 import asyncio
-import sqlite3
 from datetime import datetime, timedelta
 from discord.ext import commands
+from cogs.utilities import connect_database, EXECUTOR_BUSY_TIMEOUT
+from cogs.waiters import get_waiters
 
 
 class TimeConverter(commands.RoleConverter):
@@ -63,30 +64,59 @@ class AutoDeleteCog(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.database = sqlite3.connect('database.db')
+        self.database = connect_database('database.db')
         self.channels = {}
+        self.waiters = get_waiters(bot)
         self.db_cursor = self.database.cursor()
         self.db_cursor.execute("""CREATE TABLE IF NOT EXISTS autodelete
                                   (channel integer, guild integer, time_interval integer)""")
         self.database.commit()
 
 
+    def cog_unload(self):
+        self.waiters.cancel(self)
+        self.database.close()
+
+
     @commands.command(hidden=True)
     @commands.is_owner()
     async def restart_autodelete(self, ctx):
+        await self.restore_autodelete(ctx)
+        await ctx.send(f"Restarted autodelete in {len(self.channels)} channels.")
+
+
+    async def warm_up(self):
+        await self.restore_autodelete()
+
+
+    async def restore_autodelete(self, ctx=None):
+        """(Re)starts the autodelete task of every channel in the database."""
         for task in self.channels.values():
             task.cancel()
         self.channels = {}
-        for (channel_id, time_interval) in self.db_cursor.execute(
-            "SELECT channel, time_interval FROM autodelete"):
+        schedules = await self.bot.loop.run_in_executor(None, self.read_schedules)
+        for (channel_id, guild_id, time_interval) in schedules:
+            if self.bot.get_guild(guild_id) is None:
+                # belongs to a shard run by another process
+                continue
             channel = self.bot.get_channel(channel_id)
             if channel is None:
-                await ctx.send(f"Couldn't find channel {channel_id}.")
+                if ctx is not None:
+                    await ctx.send(f"Couldn't find channel {channel_id}.")
                 continue
-            task = asyncio.create_task(self.autodelete_task(channel, time_interval))
+            task = self.waiters.spawn(self, self.autodelete_task(channel, time_interval), channel.id)
             self.channels[channel.id] = task
-            await ctx.send(f"Restarting autodelete in channel {channel} ({channel.guild}) with time_interval {time_interval}")
-        await asyncio.gather(*self.channels.values())
+            if ctx is not None:
+                await ctx.send(f"Restarting autodelete in channel {channel} ({channel.guild}) with time_interval {time_interval}")
+
+
+    @staticmethod
+    def read_schedules():
+        database = connect_database('database.db', EXECUTOR_BUSY_TIMEOUT)
+        try:
+            return database.execute("SELECT channel, guild, time_interval FROM autodelete").fetchall()
+        finally:
+            database.close()
 
 
     @commands.command(hidden=True)
@@ -155,7 +185,8 @@ class AutoDeleteCog(commands.Cog):
                     and ctx.author == message.author
                     and message.content == "Confirm")
         try:
-            await self.bot.wait_for('message', timeout=15.0, check=is_confirmation)
+            await self.waiters.wait_for(self, 'message', timeout=15.0, check=is_confirmation,
+                                        channel_id=ctx.channel.id)
         except asyncio.TimeoutError:
             return await ctx.send("Did not receive confirmation.")
 
@@ -180,11 +211,10 @@ class AutoDeleteCog(commands.Cog):
         self.db_cursor.execute("INSERT INTO autodelete VALUES ({}, {}, {})".format(
                                ctx.channel.id, ctx.guild.id, time_interval))
         self.database.commit()
-        task = asyncio.create_task(self.autodelete_task(ctx.channel, time_interval))
+        task = self.waiters.spawn(self, self.autodelete_task(ctx.channel, time_interval),
+                                  ctx.channel.id)
         self.channels[ctx.channel.id] = task
         
-        await task
-        
 
     async def autodelete_task(self, channel, time_interval):
         try:
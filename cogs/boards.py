@@ -0,0 +1,54 @@
+import os
+import random
+import logging
+from cogs.cluestore import ClueStore, BOARD_CATEGORY_SIZE
+from cogs.utilities import EXECUTOR_BUSY_TIMEOUT
+
+BOARD_CATEGORIES = 12
+# ready boards kept for jeopardy quickstart
+BOARD_POOL = int(os.environ.get('BOARD_POOL', 20))
+
+
+def generate_board(store):
+    """
+    A full board from the store as (categories, final): twelve (category
+    dict, clue dicts) pairs with distinct categories and a final clue from
+    none of them. Returns None if the store doesn't know enough categories.
+    """
+    categories = []
+    for _ in range(BOARD_CATEGORIES):
+        category, clues = store.sample_board_category([category['id'] for category, _ in categories])
+        if category is None:
+            return None
+        category['title'] = (category['title'] or "NO CATEGORY").upper()
+        clues = random.sample(clues, BOARD_CATEGORY_SIZE)
+        for clue in clues:
+            clue['category_title'] = category['title']
+        categories.append((category, clues))
+    final = store.sample(exclude_categories=[category['id'] for category, _ in categories])
+    if final is None:
+        return None
+    final['category_title'] = (store.get_category_title(final['category_id']) or "NO CATEGORY").upper()
+    return categories, final
+
+
+def generate_boards(amount, store_path='clues.db'):
+    """
+    Up to amount boards, with a connection of its own so it can run in an
+    executor. None at all while the store knows too few categories for its
+    boards to be varied.
+    """
+    store = ClueStore(store_path, EXECUTOR_BUSY_TIMEOUT)
+    try:
+        boards = []
+        if not store.has_variety():
+            return boards
+        for _ in range(amount):
+            board = generate_board(store)
+            if board is None:
+                logging.info("The clue store doesn't know enough categories for a board yet")
+                break
+            boards.append(board)
+        return boards
+    finally:
+        store.database.close()
@@ -2,27 +2,35 @@ import discord
 from discord.ext import commands
 
 import asyncio
-import aiohttp
 import random
 import logging
 from cogs.utilities import jservice_get_json, is_valid_clue
+from cogs.client import get_client
+from cogs.waiters import get_waiters
+from cogs.logs import context_fields
+from cogs.cluestore import get_clue_store
 
 class BrowserCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.CATEGORIES_COUNT = 10
         self.CATEGORIES_AMOUNT = 18420
-        self.session = aiohttp.ClientSession(loop=bot.loop)
+        self.client = get_client(bot)
+        self.waiters = get_waiters(bot)
 
 
-    async def __before_invoke(self, ctx):
-        logging.info("{0.guild} #{0.channel.id}, {0.author}: {0.content}".format(ctx.message))
+    def cog_unload(self):
+        self.waiters.cancel(self)
+        self.bot.loop.create_task(self.client.release())
+
+    async def cog_before_invoke(self, ctx):
+        logging.info(ctx.message.content, extra=context_fields(ctx))
 
     def total_categories_pages(self):
         return (self.CATEGORIES_AMOUNT - 1) // self.CATEGORIES_COUNT + 1
 
     async def categories_embed(self, page):
-        categories_json = await jservice_get_json(self.session, 'api/categories',
+        categories_json = await jservice_get_json(self.client, 'api/categories',
                                          {'count': self.CATEGORIES_COUNT,
                                           'offset': (page - 1) * self.CATEGORIES_COUNT})
         result = discord.Embed(title='The categories are:\n',
@@ -34,7 +42,7 @@ class BrowserCog(commands.Cog):
         return result
 
     async def categories_page(self, page):
-        categories_json = await jservice_get_json(self.session, 'api/categories',
+        categories_json = await jservice_get_json(self.client, 'api/categories',
                              {'count': self.CATEGORIES_COUNT,
                               'offset': (page - 1) * self.CATEGORIES_COUNT})
         result = 'The categories are:\n'
@@ -68,9 +76,10 @@ class BrowserCog(commands.Cog):
 
         while True:
             try:
-                reaction, user = await self.bot.wait_for('reaction_add',
-                                                         timeout=30.0,
-                                                         check=reactioncheck)
+                reaction, user = await self.waiters.wait_for(self, 'reaction_add',
+                                                             timeout=30.0,
+                                                             check=reactioncheck,
+                                                             channel_id=ctx.channel.id)
             except asyncio.TimeoutError:
                 break
 
@@ -86,8 +95,9 @@ class BrowserCog(commands.Cog):
             elif reaction.emoji == browse_reactions[4]:
                 await ctx.send(f'Please say a number between 1 and like... {self.total_categories_pages()}')
                 try:
-                    message = await self.bot.wait_for('message', timeout=10.0,
-                                                      check=messagecheck)
+                    message = await self.waiters.wait_for(self, 'message', timeout=10.0,
+                                                          check=messagecheck,
+                                                          channel_id=ctx.channel.id)
                 except asyncio.TimeoutError:
                     break
                 else:
@@ -136,7 +146,7 @@ class BrowserCog(commands.Cog):
                 return
             title = ""
             if value != 0:
-                category = await jservice_get_json(self.session, 'api/clues',
+                category = await jservice_get_json(self.client, 'api/clues',
                                        {'category':cid, 'value':value})
                 if category is None:
                     await ctx.send('The search has arrived at an unknown error.')
@@ -147,7 +157,7 @@ class BrowserCog(commands.Cog):
                     return
                 title = category[0]['category']['title']
             else:
-                category = await jservice_get_json(self.session, 'api/category',
+                category = await jservice_get_json(self.client, 'api/category',
                                              {'id':cid})
                 if category is None:
                     await ctx.send('The search has arrived at an unknown error.')
@@ -166,7 +176,7 @@ class BrowserCog(commands.Cog):
             return
 
 
-        category = await jservice_get_json(self.session, 'api/category', {'id':cid})
+        category = await jservice_get_json(self.client, 'api/category', {'id':cid})
         if not category or not category['title']:
             await ctx.send(f"There's no category with id {cid}.")
             return
@@ -201,5 +211,23 @@ class BrowserCog(commands.Cog):
             result += "Unknown values are taken with a value of 0\n"
         await ctx.send(result)
 
+    @commands.command()
+    async def search(self, ctx, *, text):
+        """
+        `search <text>` finds clues whose question or answer has all those words.
+        Use "quotes" for exact phrases and a * at the end of a word to match its start.
+        """
+        results = get_clue_store().search(text)
+        if not results:
+            await ctx.send("There are no clues matching that.")
+            return
+        result = f'The clues matching **{text}** are:\n'
+        for clue_id, category_id, snippet in results:
+            line = f'`{clue_id}` (`{category_id}`): {snippet}\n'
+            if len(result) + len(line) > 2000:
+                break
+            result += line
+        await ctx.send(result)
+
 def setup(bot):
     bot.add_cog(BrowserCog(bot))
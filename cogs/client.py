@@ -0,0 +1,272 @@
+import aiohttp
+import asyncio
+import json
+import random
+import time
+import logging
+import collections
+from cogs.metrics import metrics
+from cogs.utilities import jservice, number_re
+from cogs.cluestore import get_clue_store, serve_locally
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+PROBE_PATH = 'api/categories'
+
+
+class CircuitBreaker:
+    """
+    Trips when too many recent calls failed or were too slow, or the last
+    few did one after another. The second catches a lone caller waiting on
+    a slow jservice, which never makes enough calls within the window. While
+    it's open no calls go upstream, a background probe checks every cooldown
+    seconds whether jservice is back and closes it when it is.
+    """
+
+    def __init__(self, window=30.0, minimum_calls=8, error_rate=0.5, slow_call=5.0,
+                 consecutive_failures=3, cooldown=30.0):
+        self.window = window
+        self.minimum_calls = minimum_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.consecutive_failures = consecutive_failures
+        self.cooldown = cooldown
+        self.calls = collections.deque()
+        self.failures_in_a_row = 0
+        self.state = 'closed'
+        self.opened_at = None
+        self.trips = 0
+        self.probe_task = None
+
+
+    def allows_requests(self):
+        return self.state == 'closed'
+
+
+    def record(self, ok, latency):
+        now = time.monotonic()
+        ok = ok and latency < self.slow_call
+        self.calls.append((now, ok, latency))
+        self.failures_in_a_row = 0 if ok else self.failures_in_a_row + 1
+        while self.calls and self.calls[0][0] < now - self.window:
+            self.calls.popleft()
+        if self.state != 'closed':
+            return
+        if self.failures_in_a_row >= self.consecutive_failures:
+            self.trip()
+        elif len(self.calls) >= self.minimum_calls and self.failure_rate() >= self.error_rate:
+            self.trip()
+
+
+    def failure_rate(self):
+        if not self.calls:
+            return 0.0
+        return sum(not ok for _, ok, _ in self.calls) / len(self.calls)
+
+
+    def trip(self):
+        logging.warning(f"jservice circuit breaker opened, {self.failure_rate():.0%} of the "
+                        f"last {len(self.calls)} calls and the last {self.failures_in_a_row} in a row "
+                        f"failed or took over {self.slow_call}s")
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        metrics.increment('jservice_breaker_trips_total')
+
+
+    def close(self):
+        logging.warning("jservice circuit breaker closed, jservice is back")
+        self.state = 'closed'
+        self.opened_at = None
+        self.calls.clear()
+        self.failures_in_a_row = 0
+
+
+class JServiceClient:
+    """
+    The one HTTP client every cog shares: a keep-alive connection pool with
+    DNS caching, timeouts on every request and jittered retries for GETs.
+    Cogs acquire it when they load and release it when they unload, the
+    session is closed once nobody is using it or when the bot closes.
+    """
+
+    def __init__(self, base_url=jservice, limit=32, limit_per_host=16, total_timeout=10.0,
+                 connect_timeout=3.0, retries=3, backoff=0.25, max_backoff=4.0):
+        self.base_url = base_url
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = None
+        self.users = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.clues_served = 0
+        self.breaker = CircuitBreaker()
+        self.stale = collections.OrderedDict()
+        self.stale_size = 4096
+
+
+    def get_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             ttl_dns_cache=300, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self.session
+
+
+    def acquire(self):
+        self.users += 1
+        return self
+
+
+    async def release(self):
+        self.users -= 1
+        if self.users <= 0:
+            await self.close()
+
+
+    async def close(self):
+        if self.breaker.probe_task is not None:
+            self.breaker.probe_task.cancel()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+    def pool_stats(self):
+        """Connections jservice requests are using, and requests waiting for one."""
+        if self.session is None or self.session.closed:
+            limit = min(self.limit, self.limit_per_host)
+        else:
+            connector = self.session.connector
+            # every request goes to the one host, 0 means no limit
+            limit = min(connector.limit or connector.limit_per_host,
+                        connector.limit_per_host or connector.limit)
+        in_use = min(self.in_flight, limit) if limit else self.in_flight
+        return {'limit': limit, 'in_use': in_use, 'waiting': self.in_flight - in_use}
+
+
+    def served_clue(self):
+        self.clues_served += 1
+        metrics.increment('clues_served_total')
+
+
+    def requests_per_clue(self):
+        """HTTP requests to jservice, retries and probes included, for each clue the game asked."""
+        return self.requests / self.clues_served if self.clues_served else 0.0
+
+
+    async def fetch(self, path, params, endpoint):
+        """Returns (whether jservice answered properly, the JSON text or None)."""
+        status = 'error'
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    metrics.increment('jservice_retries_total', endpoint=endpoint)
+                    # full jitter, so a burst of failures doesn't retry in lockstep
+                    await asyncio.sleep(random.uniform(0, min(self.max_backoff,
+                                                              self.backoff * 2 ** attempt)))
+                self.in_flight += 1
+                self.requests += 1
+                try:
+                    async with self.get_session().get(self.base_url + path, params=params) as r:
+                        status = r.status
+                        if r.status == 200:
+                            return True, await r.text()
+                        if r.status not in RETRY_STATUSES:
+                            return True, None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    status = type(e).__name__
+                finally:
+                    self.in_flight -= 1
+            return False, None
+        finally:
+            latency = time.perf_counter() - start
+            metrics.observe('jservice_request_seconds', latency, endpoint=endpoint)
+            metrics.increment('jservice_requests_total', endpoint=endpoint, status=status)
+            logging.info(path, extra={'endpoint': endpoint, 'params': params,
+                                      'status': status, 'latency': latency})
+
+
+    async def get_json(self, path, params=None):
+        """
+        The decoded JSON, or None if jservice doesn't have it. When jservice
+        is failing this is the last good response for the same request or
+        whatever the local clue store has.
+        """
+        params = params or {}
+        endpoint = number_re.sub('{id}', path)
+        key = (path, tuple(sorted(params.items())))
+        if self.breaker.allows_requests():
+            start = time.perf_counter()
+            ok, text = await self.fetch(path, params, endpoint)
+            self.breaker.record(ok, time.perf_counter() - start)
+            if not self.breaker.allows_requests() and self.breaker.probe_task is None:
+                self.breaker.probe_task = asyncio.ensure_future(self.probe())
+            if ok:
+                if text is None:
+                    return None
+                # keep the text, callers modify the decoded JSON
+                self.stale[key] = text
+                self.stale.move_to_end(key)
+                if len(self.stale) > self.stale_size:
+                    self.stale.popitem(last=False)
+                return json.loads(text)
+        return self.fallback(key, path, params, endpoint)
+
+
+    def fallback(self, key, path, params, endpoint):
+        text = self.stale.get(key)
+        if text is not None:
+            metrics.increment('jservice_fallbacks_total', endpoint=endpoint, source='stale')
+            return json.loads(text)
+        js = serve_locally(get_clue_store(), path, params)
+        metrics.increment('jservice_fallbacks_total', endpoint=endpoint,
+                          source='store' if js is not None else 'none')
+        return js
+
+
+    async def probe(self):
+        try:
+            while not self.breaker.allows_requests():
+                await asyncio.sleep(self.breaker.cooldown)
+                self.breaker.state = 'half-open'
+                ok, _ = await self.fetch(PROBE_PATH, {'count': 1}, PROBE_PATH)
+                if ok:
+                    self.breaker.close()
+                else:
+                    self.breaker.state = 'open'
+                    self.breaker.opened_at = time.monotonic()
+        finally:
+            self.breaker.probe_task = None
+
+
+    def breaker_report(self):
+        breaker = self.breaker
+        result = (f'Breaker is **{breaker.state}**, tripped {breaker.trips} times, '
+                  f'{breaker.failures_in_a_row} failed or slow calls in a row.\n')
+        if breaker.opened_at is not None:
+            result += f'Open for {time.monotonic() - breaker.opened_at:.0f}s, probing every {breaker.cooldown:.0f}s.\n'
+        if breaker.calls:
+            latencies = sorted(latency for _, _, latency in breaker.calls)
+            result += (f'Last {breaker.window:.0f}s: {len(breaker.calls)} calls, '
+                       f'{breaker.failure_rate():.0%} failed or slow, '
+                       f'median {latencies[len(latencies) // 2] * 1000:.0f}ms, '
+                       f'max {latencies[-1] * 1000:.0f}ms.\n')
+        result += f'{len(self.stale)} stale responses kept.\n'
+        for (name, labels), value in sorted(metrics.counters.items()):
+            if name == 'jservice_fallbacks_total':
+                labels = ' '.join(f'{label}={label_value}' for label, label_value in labels)
+                result += f'Fallbacks {labels}: {value}\n'
+        return result
+
+
+def get_client(bot):
+    """The bot-wide client, acquired for the caller. Release it in cog_unload."""
+    client = getattr(bot, 'jservice_client', None)
+    if client is None:
+        client = bot.jservice_client = JServiceClient()
+    return client.acquire()
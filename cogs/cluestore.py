@@ -0,0 +1,529 @@
+import json
+import time
+import random
+import asyncio
+import re
+import sqlite3
+import logging
+from contextlib import contextmanager
+from cogs.utilities import is_valid_clue, connect_database, LOOP_BUSY_TIMEOUT, EXECUTOR_BUSY_TIMEOUT
+from cogs.grading import parse_answers
+from cogs.metrics import metrics
+
+CLUE_COLUMNS = ('id', 'answer', 'question', 'value', 'airdate',
+                'category_id', 'game_id', 'invalid_count')
+# what the store keeps besides jservice's columns
+STORED_COLUMNS = CLUE_COLUMNS + ('answers',)
+# clues the game comes across wait this long to be written with whatever else comes in meanwhile
+INGEST_DELAY = 1.0
+# a category needs this many playable clues to be put on a board
+BOARD_CATEGORY_SIZE = 5
+# until a store that only has the categories the bot came across knows this many
+# board categories, jservice is still asked for some so boards don't keep repeating
+VARIETY_CATEGORIES = 1000
+search_term_re = re.compile(r'"([^"]*)"|(\S+)')
+search_word_re = re.compile(r'\w+')
+
+
+class ClueStore:
+    """
+    Local copy of the clues we've seen, indexed so random clues can be
+    sampled by category, value and airdate without asking jservice.
+    """
+
+    def __init__(self, path='clues.db', timeout=LOOP_BUSY_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.database = connect_database(path, timeout)
+        self.db_cursor = self.database.cursor()
+        self.db_cursor.execute("""CREATE TABLE IF NOT EXISTS clues
+                                  (id integer PRIMARY KEY, answer text, question text,
+                                   value integer, airdate text, category_id integer,
+                                   game_id integer, invalid_count integer,
+                                   valid integer, answers text)""")
+        columns = [row[1] for row in self.db_cursor.execute('PRAGMA table_info(clues)')]
+        if 'answers' not in columns:
+            self.db_cursor.execute('ALTER TABLE clues ADD COLUMN answers text')
+        self.db_cursor.execute("""CREATE TABLE IF NOT EXISTS categories
+                                  (id integer PRIMARY KEY, title text, clues_count integer)""")
+        # value and era filters are counted and skipped through without reading the table
+        self.db_cursor.execute('DROP INDEX IF EXISTS clues_by_value')
+        self.db_cursor.execute("""CREATE INDEX IF NOT EXISTS clues_by_value_and_airdate
+                                  ON clues (valid, value, airdate, id)""")
+        self.db_cursor.execute("""CREATE INDEX IF NOT EXISTS clues_by_category
+                                  ON clues (valid, category_id, value, id)""")
+        self.db_cursor.execute("""CREATE INDEX IF NOT EXISTS clues_by_airdate
+                                  ON clues (valid, airdate, id)""")
+        self.db_cursor.execute("""CREATE INDEX IF NOT EXISTS categories_by_size
+                                  ON categories (clues_count, id)""")
+        # the valid clues of each category without repeated questions, as a JSON list of ids
+        self.db_cursor.execute("""CREATE TABLE IF NOT EXISTS playable
+                                  (category_id integer PRIMARY KEY, clue_ids text, size integer)""")
+        self.db_cursor.execute(f"""CREATE INDEX IF NOT EXISTS board_categories
+                                   ON playable (category_id) WHERE size >= {BOARD_CATEGORY_SIZE}""")
+        # what the store knows about itself, like whether a dump of the corpus was imported
+        self.db_cursor.execute("""CREATE TABLE IF NOT EXISTS store_info
+                                  (key text PRIMARY KEY, value text)""")
+        self.db_cursor.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS clues_text
+                                  USING fts5(question, answer, tokenize='unicode61 remove_diacritics 2')""")
+        self.database.commit()
+        self.id_range = None
+        self.board_range = None
+        self.queued_rows = []
+        self.queued_categories = []
+        self.ingest_task = None
+
+
+    @contextmanager
+    def writing(self):
+        """
+        Commits what the block writes. On the event loop the store is only a
+        cache, so writes another process's lock kept out for too long are
+        skipped instead of failing whatever wanted the clues.
+        """
+        try:
+            yield
+            self.database.commit()
+        except sqlite3.OperationalError as e:
+            self.database.rollback()
+            if 'locked' not in str(e) or self.timeout >= EXECUTOR_BUSY_TIMEOUT:
+                raise
+            logging.warning(f"Skipped writing to the clue store: {e}")
+            metrics.increment('clue_store_skipped_writes_total')
+
+
+    def ingest_category(self, category):
+        with self.writing():
+            self.write_category(category)
+
+
+    def write_category(self, category):
+        if not category or 'id' not in category:
+            return
+        self.db_cursor.execute('INSERT OR REPLACE INTO categories VALUES (?, ?, ?)',
+                               (category['id'], category.get('title'),
+                                category.get('clues_count') or len(category.get('clues') or ())))
+
+
+    def ingest_clues(self, clues, category=None):
+        """
+        Adds jservice clue dicts (with or without a nested category) to the
+        store. Each dict gets its possible_answers, empty when nothing is
+        left of the answer, and such clues are stored as invalid.
+        """
+        rows, categories = clue_rows(clues, category)
+        self.write_clues(rows, categories)
+        return len(rows)
+
+
+    def write_clues(self, rows, categories):
+        # the same clue twice would be two rows of the full-text index
+        rows = list({row[0]: row for row in rows}.values())
+        with self.writing():
+            for category in categories:
+                self.write_category(category)
+            self.db_cursor.executemany('INSERT OR REPLACE INTO clues VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                       rows)
+            self.db_cursor.executemany('DELETE FROM clues_text WHERE rowid=?',
+                                       [(row[0],) for row in rows])
+            self.db_cursor.executemany('INSERT INTO clues_text (rowid, question, answer) VALUES (?, ?, ?)',
+                                       [(row[0], row[2] or '', row[1] or '') for row in rows])
+            self.refresh_playable({row[5] for row in rows if row[5] is not None})
+        self.id_range = None
+
+
+    def queue_clues(self, clues, category=None):
+        """
+        ingest_clues for the event loop: the clues get their possible_answers
+        right away, and are written in a batch from an executor with whatever
+        else is queued within INGEST_DELAY.
+        """
+        rows, categories = clue_rows(clues, category)
+        self.queued_rows.extend(rows)
+        self.queued_categories.extend(categories)
+        self.schedule_ingest()
+
+
+    def queue_category(self, category):
+        if category and 'id' in category:
+            # copied, the game goes on to change the title
+            self.queued_categories.append(dict(category))
+            self.schedule_ingest()
+
+
+    def schedule_ingest(self):
+        if self.ingest_task is None:
+            self.ingest_task = asyncio.ensure_future(self.ingest_later())
+
+
+    async def ingest_later(self):
+        await asyncio.sleep(INGEST_DELAY)
+        self.ingest_task = None
+        rows, self.queued_rows = self.queued_rows, []
+        categories, self.queued_categories = self.queued_categories, []
+        start = time.perf_counter()
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, write_clues, self.path, rows, categories)
+        except Exception:
+            # it's only a cache, jservice still has them
+            logging.exception(f"Couldn't write {len(rows)} clues to the clue store")
+            return
+        metrics.observe('clue_store_ingest_seconds', time.perf_counter() - start)
+        self.id_range = None
+        self.board_range = None
+
+
+    def refresh_playable(self, category_ids=None):
+        """Works out the playable clues of the categories again, of every category if None."""
+        if category_ids is None:
+            self.db_cursor.execute('DELETE FROM playable')
+            rows = self.db_cursor.execute('SELECT category_id, id, question FROM clues '
+                                          'WHERE valid = 1 ORDER BY category_id, id').fetchall()
+        else:
+            rows = []
+            for category_id in category_ids:
+                rows.extend(self.db_cursor.execute('SELECT category_id, id, question FROM clues '
+                                                   'WHERE valid = 1 AND category_id = ? ORDER BY id',
+                                                   (category_id,)).fetchall())
+        categories = {category_id: [] for category_id in category_ids or ()}
+        for category_id, clue_id, question in rows:
+            categories.setdefault(category_id, []).append((clue_id, question))
+        playable = []
+        for category_id, clues in categories.items():
+            clue_ids = playable_clue_ids(clues)
+            playable.append((category_id, json.dumps(clue_ids), len(clue_ids)))
+        self.db_cursor.executemany('INSERT OR REPLACE INTO playable VALUES (?, ?, ?)', playable)
+        self.board_range = None
+
+
+    def is_complete(self):
+        """Whether the store holds the whole corpus, rather than only the clues the bot came across."""
+        row = self.db_cursor.execute("SELECT value FROM store_info WHERE key = 'imported'").fetchone()
+        return row is not None
+
+
+    def mark_complete(self, amount):
+        self.db_cursor.execute("INSERT OR REPLACE INTO store_info VALUES ('imported', ?)", (str(amount),))
+        self.database.commit()
+
+
+    def get_id_range(self):
+        if self.id_range is None:
+            self.id_range = self.db_cursor.execute('SELECT min(id), max(id) FROM clues').fetchone()
+        return self.id_range
+
+
+    def get_category_title(self, category_id):
+        row = self.db_cursor.execute('SELECT title FROM categories WHERE id=?',
+                                     (category_id,)).fetchone()
+        return row and row[0]
+
+
+    def get_clue(self, clue_id):
+        row = self.db_cursor.execute('SELECT {} FROM clues WHERE id=?'.format(', '.join(STORED_COLUMNS)),
+                                     (clue_id,)).fetchone()
+        return row and clue_from_row(row)
+
+
+    def get_category(self, category_id):
+        row = self.db_cursor.execute('SELECT id, title, clues_count FROM categories WHERE id=?',
+                                     (category_id,)).fetchone()
+        return row and {'id': row[0], 'title': row[1], 'clues_count': row[2]}
+
+
+    def get_category_clues(self, category_id):
+        rows = self.db_cursor.execute('SELECT {} FROM clues WHERE category_id=? ORDER BY id'.format(
+                                      ', '.join(STORED_COLUMNS)), (category_id,)).fetchall()
+        return [clue_from_row(row) for row in rows]
+
+
+    def sample(self, category_id=None, value=None, min_date=None, max_date=None,
+               min_category_size=None, exclude_categories=(), tries=8):
+        """
+        Returns a random valid clue dict matching every filter that isn't None,
+        and from none of the excluded categories, or None if the store has no
+        such clue. A value of 0 means unknown value.
+        Every matching clue is as likely: a few random ids are looked up, and
+        when they all miss the matches are counted and the one at a random
+        offset is read from the filter's index.
+        That fallback reads every match, about 13ms for all of a 177k clue
+        store and 50ms with min_category_size, but filters matching a fair
+        share of the ids are nearly always hit by a probe first (all eight
+        miss a filter matching half of them 0.4% of the time), so it mostly
+        counts the few matches of narrow filters.
+        """
+        low, high = self.get_id_range()
+        if low is None:
+            return None
+        columns = ', '.join(f'clues.{column}' for column in STORED_COLUMNS)
+        conditions = ['clues.valid = 1']
+        params = []
+        if category_id is not None:
+            conditions.append('clues.category_id = ?')
+            params.append(category_id)
+        if value == 0:
+            conditions.append('(clues.value IS NULL OR clues.value = 0)')
+        elif value is not None:
+            conditions.append('clues.value = ?')
+            params.append(value)
+        if min_date is not None:
+            conditions.append('clues.airdate >= ?')
+            params.append(min_date)
+        if max_date is not None:
+            conditions.append('clues.airdate <= ?')
+            params.append(max_date)
+        if min_category_size is not None:
+            conditions.append("""clues.category_id IN
+                                 (SELECT id FROM categories WHERE clues_count >= ?)""")
+            params.append(min_category_size)
+        if exclude_categories:
+            conditions.append('clues.category_id NOT IN ({})'.format(', '.join('?' * len(exclude_categories))))
+            params.extend(exclude_categories)
+        # each id in the range is as likely, so a hit is a uniform pick of the matches,
+        # and filters that match too few clues to be hit are cheap to count
+        for _ in range(tries):
+            row = self.db_cursor.execute(f'SELECT {columns} FROM clues WHERE clues.id = ? AND ' +
+                                         ' AND '.join(conditions),
+                                         [random.randint(low, high)] + params).fetchone()
+            if row is not None:
+                return clue_from_row(row)
+        if len(conditions) == 1:
+            # otherwise sqlite counts every valid clue in an index instead of the table
+            conditions = ['+clues.valid = 1']
+        conditions = ' AND '.join(conditions)
+        amount = self.db_cursor.execute(f'SELECT count(*) FROM clues WHERE {conditions}',
+                                        params).fetchone()[0]
+        if amount == 0:
+            return None
+        row = self.db_cursor.execute(f'SELECT clues.id FROM clues WHERE {conditions} LIMIT 1 OFFSET ?',
+                                     params + [random.randrange(amount)]).fetchone()
+        return row and self.get_clue(row[0])
+
+
+    def get_board_range(self):
+        """(smallest id, largest id, amount) of the categories with enough clues for a board."""
+        if self.board_range is None:
+            self.board_range = self.db_cursor.execute(
+                f'SELECT min(category_id), max(category_id), count(*) FROM playable '
+                f'WHERE size >= {BOARD_CATEGORY_SIZE}').fetchone()
+        return self.board_range
+
+
+    def has_variety(self):
+        """Whether boards from the store alone wouldn't keep repeating the same categories."""
+        return self.is_complete() or self.get_board_range()[2] >= VARIETY_CATEGORIES
+
+
+    def prefers_remote_category(self):
+        """Whether to ask jservice for a category, more rarely the more of them the store knows."""
+        if self.has_variety():
+            return False
+        return random.random() >= self.get_board_range()[2] / VARIETY_CATEGORIES
+
+
+    def sample_board_category(self, exclude=(), tries=8):
+        """
+        A random category with enough playable clues for a board that isn't
+        one of the excluded ids, as (category dict, playable clue dicts), or
+        (None, None) if the store doesn't know of one. Each such category is
+        as likely: a few random ids are looked up, and when they all miss
+        the one at a random offset of the others is read.
+        """
+        low, high, amount = self.get_board_range()
+        if not amount:
+            return None, None
+        exclude = set(exclude)
+        conditions = f'size >= {BOARD_CATEGORY_SIZE}'
+        for _ in range(tries):
+            row = self.db_cursor.execute(f'SELECT category_id, clue_ids FROM playable WHERE {conditions} '
+                                         'AND category_id = ?', (random.randint(low, high),)).fetchone()
+            if row is not None and row[0] not in exclude:
+                break
+        else:
+            exclude = list(exclude)
+            if exclude:
+                conditions += ' AND category_id NOT IN ({})'.format(', '.join('?' * len(exclude)))
+            amount = self.db_cursor.execute(f'SELECT count(*) FROM playable WHERE {conditions}',
+                                            exclude).fetchone()[0]
+            if amount == 0:
+                return None, None
+            row = self.db_cursor.execute(f'SELECT category_id, clue_ids FROM playable WHERE {conditions} '
+                                         'LIMIT 1 OFFSET ?', exclude + [random.randrange(amount)]).fetchone()
+            if row is None:
+                return None, None
+        category_id, clue_ids = row
+        clue_ids = json.loads(clue_ids)
+        rows = self.db_cursor.execute('SELECT {} FROM clues WHERE id IN ({})'.format(
+                                      ', '.join(STORED_COLUMNS), ', '.join('?' * len(clue_ids))),
+                                      clue_ids).fetchall()
+        category = self.get_category(category_id) or {'id': category_id, 'title': None,
+                                                      'clues_count': len(clue_ids)}
+        return category, [clue_from_row(row) for row in rows]
+
+
+    def search(self, text, limit=10):
+        """
+        Full-text search over questions and answers. Words are all required,
+        "quoted words" must appear as a phrase and a trailing * makes a word
+        a prefix. Returns (id, category_id, snippet) tuples, best matches first.
+        """
+        query = to_match_query(text)
+        if not query:
+            return []
+        return self.db_cursor.execute("""SELECT clues_text.rowid, clues.category_id,
+                                             snippet(clues_text, -1, '**', '**', '...', 10)
+                                         FROM clues_text JOIN clues ON clues.id = clues_text.rowid
+                                         WHERE clues_text MATCH ? ORDER BY rank LIMIT ?""",
+                                      (query, limit)).fetchall()
+
+
+def clue_rows(clues, category=None):
+    """
+    Rows of STORED_COLUMNS for jservice clue dicts and the categories to
+    write with them. Sets the possible_answers of each dict.
+    """
+    rows = []
+    categories = []
+    for clue in clues:
+        if not clue or clue.get('id') is None:
+            continue
+        if clue.get('category'):
+            categories.append(dict(clue['category']))
+        clue['possible_answers'] = answers = parse_answers(clue.get('answer'))
+        if not answers and clue.get('answer'):
+            logging.info(f"Clue {clue['id']} has no answer left to grade: {clue['answer']!r}")
+            metrics.increment('clues_unanswerable_total')
+        valid = answers and is_valid_clue({'question': clue.get('question'),
+                                           'answer': clue.get('answer'),
+                                           'invalid_count': clue.get('invalid_count')})
+        rows.append((clue['id'], clue.get('answer'), clue.get('question'),
+                     clue.get('value'), (clue.get('airdate') or '')[:10],
+                     clue.get('category_id') or (clue.get('category') or category or {}).get('id'),
+                     clue.get('game_id'), clue.get('invalid_count'),
+                     int(bool(valid)), json.dumps(answers)))
+    if category:
+        categories.append(dict(category))
+    return rows, categories
+
+
+def write_clues(path, rows, categories):
+    """Writes rows from clue_rows with a connection of its own, for an executor."""
+    store = ClueStore(path, EXECUTOR_BUSY_TIMEOUT)
+    try:
+        store.write_clues(rows, categories)
+    finally:
+        store.database.close()
+
+
+def playable_clue_ids(clues):
+    """Ids of the (id, question) pairs, skipping questions an earlier clue already asked."""
+    seen = set()
+    clue_ids = []
+    for clue_id, question in clues:
+        question = (question or '').strip().lower()
+        if question not in seen:
+            seen.add(question)
+            clue_ids.append(clue_id)
+    return clue_ids
+
+
+def clue_from_row(row):
+    """A clue dict from a row of STORED_COLUMNS, with its possible answers if they were worked out."""
+    clue = dict(zip(CLUE_COLUMNS, row))
+    if row[-1] is not None:
+        clue['possible_answers'] = json.loads(row[-1])
+    return clue
+
+
+def serve_locally(store, path, params):
+    """
+    Answers a jservice request from the store as well as it can, for when
+    jservice is down. Returns None when the store doesn't have it.
+    """
+    parts = path.split('/')
+    if len(parts) == 2 and parts[0] in ('clues', 'categories') and parts[1].endswith('.json'):
+        try:
+            item_id = int(parts[1][:-len('.json')])
+        except ValueError:
+            return None
+        if parts[0] == 'clues':
+            return store.get_clue(item_id)
+        return store.get_category(item_id)
+    if path == 'api/category':
+        category = store.get_category(int(params.get('id', 0)))
+        if category is None:
+            return None
+        category['clues'] = store.get_category_clues(category['id'])
+        return category if category['clues'] else None
+    if path == 'api/clues' and 'category' in params:
+        category = store.get_category(int(params['category']))
+        clues = [clue for clue in store.get_category_clues(int(params['category']))
+                 if 'value' not in params or clue['value'] == int(params['value'])]
+        for clue in clues:
+            clue['category'] = category
+        return clues or None
+    return None
+
+
+def to_match_query(text):
+    """Turns what a user typed into an FTS5 query that can't be a syntax error."""
+    terms = []
+    for phrase, word in search_term_re.findall(text):
+        words = search_word_re.findall(phrase or word)
+        if not words:
+            continue
+        term = '"{}"'.format(' '.join(words))
+        if word.endswith('*'):
+            term += ' *'
+        terms.append(term)
+    return ' '.join(terms)
+
+
+def load_dump(path):
+    """
+    Reads a JSON dump of the corpus: a list of jservice clue dicts, each
+    with its category nested under 'category'.
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+def import_dump(path, store_path='clues.db', batch_size=5000):
+    """Blocking, meant to run in an executor with its own connection."""
+    store = ClueStore(store_path, EXECUTOR_BUSY_TIMEOUT)
+    clues = load_dump(path)
+    for i in range(0, len(clues), batch_size):
+        store.ingest_clues(clues[i:i+batch_size])
+    store.mark_complete(len(clues))
+    store.database.close()
+    return len(clues)
+
+
+def warm_clue_store(store_path='clues.db'):
+    """
+    Reads the indexes once so the first searches don't wait on the disk,
+    and works out the playable clues of stores from before they were kept.
+    """
+    store = ClueStore(store_path, EXECUTOR_BUSY_TIMEOUT)
+    if store.db_cursor.execute('SELECT count(*) FROM playable').fetchone()[0] == 0:
+        store.refresh_playable()
+        store.database.commit()
+    store.database.close()
+    database = connect_database(store_path, EXECUTOR_BUSY_TIMEOUT)
+    try:
+        for index in ('clues_by_value_and_airdate', 'clues_by_category', 'clues_by_airdate'):
+            database.execute(f'SELECT count(*) FROM clues INDEXED BY {index}').fetchone()
+        database.execute("SELECT count(*) FROM clues_text WHERE clues_text MATCH 'a*'").fetchone()
+    finally:
+        database.close()
+
+
+clue_store = None
+
+
+def get_clue_store():
+    global clue_store
+    if clue_store is None:
+        logging.info("Opening clue store")
+        clue_store = ClueStore()
+    return clue_store
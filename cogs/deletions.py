@@ -0,0 +1,63 @@
+import discord
+
+import asyncio
+import logging
+from cogs.metrics import metrics
+
+# how long messages wait to be deleted with whatever else comes in meanwhile
+DELETE_DELAY = 2.0
+# the most messages Discord deletes in one bulk delete
+BULK_DELETE_LIMIT = 100
+
+
+class Deletions:
+    """
+    Messages of a channel waiting to be deleted. Everything added within
+    DELETE_DELAY of the first one goes in a single bulk delete, and flush
+    deletes whatever is left right away. Messages that can't be bulk
+    deleted, and those in DMs which have no bulk delete, are deleted one at
+    a time. The pending delete is its own background task, so stopping the
+    game that added the messages doesn't cancel it.
+    """
+
+    def __init__(self, waiters, channel):
+        self.waiters = waiters
+        self.channel = channel
+        self.messages = []
+        self.task = None
+
+
+    def add(self, message):
+        self.messages.append(message)
+        if self.task is None:
+            self.task = self.waiters.spawn(self, self.flush_later(), self.channel.id)
+
+
+    async def flush_later(self):
+        await asyncio.sleep(DELETE_DELAY)
+        self.task = None
+        await self.flush()
+
+
+    async def flush(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        messages, self.messages = self.messages, []
+        for i in range(0, len(messages), BULK_DELETE_LIMIT):
+            batch = messages[i:i + BULK_DELETE_LIMIT]
+            if len(batch) > 1 and not isinstance(self.channel, discord.DMChannel):
+                try:
+                    await self.channel.delete_messages(batch)
+                except (discord.HTTPException, discord.ClientException) as e:
+                    # older than two weeks or no permission to manage messages
+                    logging.info(f"Couldn't bulk delete {len(batch)} messages: {e}")
+                else:
+                    metrics.increment('clean_mode_deletes_total', len(batch), method='bulk')
+                    continue
+            for message in batch:
+                try:
+                    await message.delete()
+                except discord.HTTPException:
+                    continue
+                metrics.increment('clean_mode_deletes_total', method='single')
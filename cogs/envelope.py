@@ -0,0 +1,55 @@
+import re
+import dataclasses
+import collections
+
+answer_start_re = re.compile(r"^(?:wh(?:at|ere|o)(?: is|'s|s| are)|que es|qué es) +")
+answer_starts = ("what is ", "what's ", "whats ", "what are ",
+                 "where is ", "where's ", "wheres " "where are ",
+                 "who is ", "who's ", "whos ", "who are ",
+                 "que es ", "qué es ",
+                 "skip clue")
+
+# every pending check sees the same few messages, so a few hundred is plenty
+ENVELOPE_CACHE = 256
+
+
+@dataclasses.dataclass
+class Envelope:
+    text: str
+    is_answer: bool
+    skip: bool
+    guess: str
+    is_bet: bool
+    # None when what follows bet isn't a number
+    bet: int = None
+
+
+envelopes = collections.OrderedDict()
+
+
+def parse_content(content):
+    text = content.lower()
+    is_answer = text.startswith(answer_starts)
+    is_bet = text.startswith("bet ")
+    bet = None
+    if is_bet:
+        try:
+            bet = int(content[4:])
+        except ValueError:
+            pass
+    return Envelope(text, is_answer, text.startswith("skip clue"),
+                    answer_start_re.sub('', text, 1) if is_answer else text, is_bet, bet)
+
+
+def parse_message(message):
+    """
+    The lowercased text of a message, whether it answers or bets and what
+    with, worked out the first time any check looks at the message.
+    """
+    key = (message.id, message.content)
+    envelope = envelopes.get(key)
+    if envelope is None:
+        envelope = envelopes[key] = parse_content(message.content)
+        if len(envelopes) > ENVELOPE_CACHE:
+            envelopes.popitem(last=False)
+    return envelope
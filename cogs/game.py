@@ -1,30 +1,46 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
-import aiohttp
+import os
+import json
+import time
 import asyncio
+import sqlite3
 import random
 import logging
-import re
-from difflib import SequenceMatcher
+import collections
 from datetime import datetime
-from cogs.utilities import jservice_get_json, is_valid_clue
+from cogs.utilities import jservice_get_json, is_valid_clue, connect_database
+from cogs.client import get_client
+from cogs.waiters import get_waiters
+from cogs.logs import context_fields
+from cogs.grading import grade, grade_answer, grade_many, parse_answers
+from cogs.cluestore import (get_clue_store, warm_clue_store, playable_clue_ids, CLUE_COLUMNS,
+                            BOARD_CATEGORY_SIZE)
+from cogs.boards import generate_board, generate_boards, BOARD_POOL
+from cogs.stats import get_player_stats
+from cogs.deletions import Deletions
+from cogs.members import get_member_cache
+from cogs.envelope import parse_message
+from cogs.metrics import metrics
 import dataclasses
 
-tag_re = re.compile(r'<[^>]*>')
-between_parentheses_re = re.compile(r'\([^\)]*\)')
-parentheses_re = re.compile(r'[()]')
-non_letters_re = re.compile(r'\W')
-answer_start_re = re.compile(r"^(?:wh(?:at|ere|o)(?: is|'s|s| are)|que es|qué es) +")
-answer_starts = ("what is ", "what's ", "whats ", "what are ",
-                 "where is ", "where's ", "wheres " "where are ",
-                 "who is ", "who's ", "whos ", "who are ",
-                 "que es ", "qué es ",
-                 "skip clue")
-
 CATEGORY_AMOUNT = 23411
 CLUE_AMOUNT = 176778
 
+# channels nobody has used for this long are evicted, and past this many the
+# least recently used ones are
+CHANNEL_IDLE = float(os.environ.get('CHANNEL_IDLE', 30*60))
+MAX_CHANNELS = int(os.environ.get('MAX_CHANNELS', 5000))
+# channels used more recently than this are never evicted, a finished clue
+# still waits a little for reactions
+CHANNEL_BUSY = 60.0
+# jservice's api/clues answers 100 clues at a time, find remembers how many
+# pages it saw for this many filter combinations
+JSERVICE_PAGE = 100
+REMOTE_FILTERS = 1024
+DEFAULT_SETTINGS = {'button mode': False, 'infinite mode': True, 'clean mode': False}
+
 
 @dataclasses.dataclass
 class Category:
@@ -57,6 +73,9 @@ class Clue:
     def __post_init__(self):
         if self.value is None:
             self.value = 0
+        # clues from the store or jservice come with these worked out at ingest
+        if not self.possible_answers:
+            self.possible_answers = parse_answers(self.answer)
 
 
     def question_to_str(self):
@@ -65,52 +84,8 @@ class Clue:
                ).format(self, self.airdate[5:7], self.airdate[2:4])
 
 
-    def update_possible_answers(self):
-        answer = tag_re.sub('', self.answer).strip().lower()
-        if answer[0] == "(":
-            answers = [between_parentheses_re.sub('', answer),
-                                     parentheses_re.sub('', answer)]
-        elif answer[-1] == ")":
-            start = answer.find("(")
-            if answer[start+1:].startswith("or "):
-                answers = [answer[:start], answer[start+4:-1]]
-            else:
-                answers = [between_parentheses_re.sub('', answer),
-                                         parentheses_re.sub('', answer)]
-        else:
-            answers = [answer]
-        for i in range(len(answers)):
-            try:
-                answer = int(answers[i])
-            except ValueError:
-                continue
-            else:
-                answers[i] = answer
-        self.possible_answers = answers
-
-
     def is_correct_answer(self, answer, similarity_ratio=0.65):
-        close_answer = False
-        for correct_answer in self.possible_answers:
-            if isinstance(correct_answer, int):
-                try:
-                    if int(answer) == correct_answer:
-                        return True
-                except ValueError:
-                    pass
-            elif similarity_ratio <= SequenceMatcher(None, correct_answer,
-                                                     answer).ratio():
-                return True
-            elif not close_answer:
-                for word in answer.split():
-                    if not re.search(rf'\b{re.escape(word)}\b', correct_answer):
-                        break
-                else:
-                    close_answer = True
-        if close_answer:
-            return None
-        else:
-            return False
+        return grade(self.possible_answers, answer, similarity_ratio)
 
 
     def __eq__(self, other):
@@ -182,7 +157,7 @@ class JeopardyGame:
 
 
     def has_category(self, category_id):
-        return any(category and category._id == category_id for category in self.categories)
+        return any(category and category.id_ == category_id for category in self.categories)
 
 
     def get_leader(self):
@@ -332,6 +307,29 @@ class JeopardyGame:
         return result
 
 
+    def is_empty(self):
+        return not self.players and self.final is None and self.categories == [None]*12
+
+
+    def to_dict(self):
+        result = dataclasses.asdict(self)
+        if self.start_time is not None:
+            result['start_time'] = self.start_time.isoformat()
+        return result
+
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data['categories'] = [category and Category(**category) for category in data['categories']]
+        data['clues'] = [[Clue(**clue) for clue in category] for category in data['clues']]
+        data['final'] = data['final'] and Clue(**data['final'])
+        if data['start_time'] is not None:
+            data['start_time'] = datetime.fromisoformat(data['start_time'])
+        data['modifying'] = False
+        return cls(**data)
+
+
     def mark_as_answered(self, clue):
         clue.answered = True
         self.answered += 1
@@ -365,64 +363,249 @@ async def award_points(ctx, game, player_id, points):
 
 class GameCog(commands.Cog):
 
-    async def __before_invoke(self, ctx):
-        logging.info("{0.guild} #{0.channel.id}, ({1.hour}:{1.minute}:{1.second}) {0.author}: {0.content}".format(ctx.message, datetime.now()))
+    async def cog_before_invoke(self, ctx):
+        logging.info(ctx.message.content, extra=context_fields(ctx))
 
     def __init__(self, bot):
         self.bot = bot
         self.similarity_ratio = 0.65
-        self.channels = {}
-        self.session = aiohttp.ClientSession(loop=bot.loop)
+        # least recently used first
+        self.channels = collections.OrderedDict()
+        self.evicted = collections.Counter()
+        self.boards = collections.deque()
+        # filters -> (pages of api/clues seen, whether the last one was), least recently used first
+        self.remote_pages = collections.OrderedDict()
+        self.database = connect_database('database.db')
+        self.database.execute("""CREATE TABLE IF NOT EXISTS channels
+                                 (id integer PRIMARY KEY, state text)""")
+        self.database.commit()
+        self.client = get_client(bot)
+        self.waiters = get_waiters(bot)
+        self.stats = get_player_stats(bot)
+        self.members = get_member_cache(bot)
+        self.exported = False
         random.seed()
+        self.evict_idle_channels.start()
+        self.top_up_boards.start()
+
+
+    def cog_unload(self):
+        self.evict_idle_channels.cancel()
+        self.top_up_boards.cancel()
+        # an exported database is the new GameCog's now
+        if not self.exported:
+            self.waiters.cancel(self)
+            self.database.close()
+        self.bot.loop.create_task(self.client.release())
+
+
+    def export_state(self):
+        """What the GameCog of a reloaded module takes over. Clues being played finish on the old code."""
+        self.exported = True
+        return {'channels': self.channels, 'evicted': self.evicted, 'boards': self.boards,
+                'database': self.database}
+
+
+    def adopt_state(self, state):
+        self.database.close()
+        self.database = state['database']
+        self.channels = state['channels']
+        self.evicted = state['evicted']
+        self.boards = state['boards']
+
+
+    async def warm_up(self):
+        get_clue_store().get_id_range()
+        await self.bot.loop.run_in_executor(None, warm_clue_store)
 
 
     def get_channel(self, channel):
-        if channel not in self.channels:
-            logging.info(f"Defining channel {channel}")
-            self.channels[channel] = {
-                'button mode' : False,
-                'infinite mode' : True,
-                'clean mode' : False,
-                'active' : False,
-                'id' : channel,
-                'jeopardy' : JeopardyGame()
-            }
+        if channel in self.channels:
+            self.channels.move_to_end(channel)
+            self.channels[channel]['last active'] = time.monotonic()
+        else:
+            self.channels[channel] = self.load_channel(channel)
+            self.channels[channel]['last active'] = time.monotonic()
+            if len(self.channels) > MAX_CHANNELS:
+                self.evict_channels(MAX_CHANNELS, 'lru')
         return self.channels[channel]
 
+
+    def load_channel(self, channel):
+        row = self.database.execute('SELECT state FROM channels WHERE id=?', (channel,)).fetchone()
+        if row is None:
+            logging.info(f"Defining channel {channel}")
+            return {**DEFAULT_SETTINGS, 'active': False, 'state': 'idle', 'loop': None, 'id': channel,
+                    'jeopardy': JeopardyGame()}
+        logging.info(f"Restoring channel {channel}")
+        state = json.loads(row[0])
+        self.database.execute('DELETE FROM channels WHERE id=?', (channel,))
+        self.database.commit()
+        metrics.increment('game_channels_restored_total')
+        return {**DEFAULT_SETTINGS, **state['settings'], 'active': False, 'state': 'idle', 'loop': None, 'id': channel,
+                'jeopardy': JeopardyGame.from_dict(state['jeopardy'])}
+
+
+    def claim(self, channel, loop, state):
+        """Makes the channel show the state of the loop about to play, unless a clue is already being played."""
+        if not channel['active']:
+            channel['loop'] = loop
+        self.set_state(channel, loop, state)
+
+
+    def set_state(self, channel, loop, state):
+        if channel.get('loop') is loop:
+            channel['state'] = state
+
+
+    def release(self, channel, loop):
+        if channel.get('loop') is loop:
+            channel['loop'] = None
+            channel['state'] = 'idle'
+
+
+    def stop_waiting(self, channel_id):
+        """Cancels whatever question or round the channel is waiting on."""
+        self.waiters.cancel(self, channel_id)
+        channel = self.get_channel(channel_id)
+        channel['active'] = False
+        channel['state'] = 'idle'
+        channel['loop'] = None
+
+
+    def is_busy(self, channel):
+        return (channel['active'] or channel['state'] != 'idle' or channel['jeopardy'].modifying or
+                time.monotonic() - channel['last active'] < CHANNEL_BUSY)
+
+
+    def evict_channels(self, keep, reason, idle=None):
+        """
+        Evicts the least recently used channels until only keep are left, or
+        every channel idle for longer than idle seconds. Channels with
+        settings or a game worth keeping are saved first.
+        """
+        now = time.monotonic()
+        evicted = []
+        for channel_id, channel in self.channels.items():
+            if len(self.channels) - len(evicted) <= keep:
+                break
+            if idle is not None and now - channel['last active'] < idle:
+                break
+            if not self.is_busy(channel):
+                evicted.append(channel_id)
+        saved = []
+        for channel_id in evicted:
+            channel = self.channels[channel_id]
+            settings = {key: channel[key] for key in DEFAULT_SETTINGS}
+            if settings != DEFAULT_SETTINGS or not channel['jeopardy'].is_empty():
+                state = {'settings': settings, 'jeopardy': channel['jeopardy'].to_dict()}
+                saved.append((channel_id, json.dumps(state)))
+        if saved:
+            try:
+                self.database.executemany('INSERT OR REPLACE INTO channels VALUES (?, ?)', saved)
+                self.database.commit()
+            except sqlite3.OperationalError as e:
+                # another process held the lock, keep them in memory until next time
+                self.database.rollback()
+                logging.warning(f"Couldn't save {len(saved)} channels, not evicting them: {e}")
+                return
+        for channel_id in evicted:
+            del self.channels[channel_id]
+        if evicted:
+            logging.info(f"Evicted {len(evicted)} channels ({reason}), saved {len(saved)}")
+            self.evicted[reason] += len(evicted)
+            metrics.increment('game_channels_evicted_total', len(evicted), reason=reason)
+        metrics.set_gauge('game_channels', len(self.channels))
+
+
+    @tasks.loop(minutes=5.0)
+    async def evict_idle_channels(self):
+        self.evict_channels(0, 'idle', CHANNEL_IDLE)
+
+
+    @tasks.loop(seconds=30.0)
+    async def top_up_boards(self):
+        missing = BOARD_POOL - len(self.boards)
+        if missing > 0:
+            self.boards.extend(await self.bot.loop.run_in_executor(None, generate_boards, missing))
+        metrics.set_gauge('board_pool', len(self.boards))
+
+
+    def record(self, ctx, kind, user_id, clue, correct=None, points=0):
+        self.stats.record(kind, ctx.guild and ctx.guild.id, ctx.channel.id, user_id, clue.id_,
+                          correct, points)
+
+
+    def load_board(self, game, board):
+        categories, final = board
+        game.categories = [None]*12
+        game.clues = [[] for _ in range(12)]
+        for category, clues in categories:
+            clues = [Clue(**fix_id(clue)) for clue in clues]
+            game.add_jeopardy_clues(Category(**fix_id(category)), clues, info=False)
+        game.final = Clue(**fix_id(final))
+        game.final.answered = False
+
+
+    def channels_report(self):
+        saved, = self.database.execute('SELECT COUNT(*) FROM channels').fetchone()
+        evicted = ', '.join(f'{amount} {reason}' for reason, amount in self.evicted.items())
+        states = collections.Counter(channel['state'] for channel in self.channels.values())
+        states = ', '.join(f'{amount} {state}' for state, amount in states.most_common())
+        return (f'{len(self.channels)} channels in memory (at most {MAX_CHANNELS}, evicted after '
+                f'{CHANNEL_IDLE / 60:.0f} minutes idle), {saved} saved.\n'
+                f'States: {states or "none"}.\n'
+                f'Evicted since loading: {evicted or "none"}.')
+
     async def button_check(self, question, button_leader_ids, game=None):
         def reactioncheck(reaction, user):
             return (reaction.message.id == question.id and
                     user.id != self.bot.user.id and
                     user.id not in button_leader_ids and
-                    (game is None or (game.has_player(user.id) is not None)) and
+                    (game is None or game.has_player(user.id)) and
                     reaction.emoji == '🔴')
 
         await question.add_reaction('🔴')
 
         try:
-            _, user = await self.bot.wait_for('reaction_add', timeout=15.0, check=reactioncheck)
+            _, user = await self.waiters.wait_for(self, 'reaction_add', timeout=15.0, check=reactioncheck,
+                                                   channel_id=question.channel.id)
         except asyncio.TimeoutError:
             return None, None
         return user.id, user.display_name
 
     async def get_random_clue(self, get_category=False):
         for _ in range(100):
-            clue_id = random.randint(1, CLUE_AMOUNT)
-            clue = await jservice_get_json(self.session, 'clues/{}.json'.format(clue_id))
-            if not clue:
-                continue
+            if self.client.breaker.allows_requests():
+                clue_id = random.randint(1, CLUE_AMOUNT)
+                clue = await jservice_get_json(self.client, 'clues/{}.json'.format(clue_id))
+                if not clue:
+                    continue
+                get_clue_store().queue_clues([clue])
+            else:
+                # jservice is having trouble, any clue we've kept will do
+                clue = get_clue_store().sample()
+                if clue is None:
+                    break
             if not is_valid_clue(clue):
                 continue
             clue = Clue(**fix_id(clue))
-            category = await jservice_get_json(self.session, 'categories/{}.json'.format(clue.category_id))
+            category = await jservice_get_json(self.client, 'categories/{}.json'.format(clue.category_id))
+            if not category:
+                category = {'id': clue.category_id, 'title': "NO CATEGORY", 'clues_count': 0}
+            get_clue_store().queue_category(category)
             category['title'] = category['title'].upper()
             clue.category_title = category['title']
             if get_category:
                 category = Category(**fix_id(category))
                 return clue, category
             return clue
+        if get_category:
+            return None, None
+        return None
 
     async def end_jeopardy_clue(self, ctx, game, question, clue):
+        """Moves the game on after a clue and returns the clue the leader picks next, if any."""
         new_round = game.mark_as_answered(clue)
         if new_round == 2:
             await ctx.send("And that takes us to the **Double Jeopardy!** round.")
@@ -448,7 +631,8 @@ class GameCog(commands.Cog):
         for bot_reaction in ['⬇', '⏭', '📋']:
             await question.add_reaction(bot_reaction)
         try:
-            reaction, _ = await self.bot.wait_for('reaction_add', timeout=20.0, check=reaction_check)
+            reaction, _ = await self.waiters.wait_for(self, 'reaction_add', timeout=20.0, check=reaction_check,
+                                                       channel_id=ctx.channel.id)
         except asyncio.TimeoutError:
             for bot_reaction in ['⬇', '⏭', '📋']:
                 await question.remove_reaction(bot_reaction, self.bot.user)
@@ -467,15 +651,74 @@ class GameCog(commands.Cog):
             next_clue = None
         if next_clue is None:
             await ctx.send("Something went wrong...")
-            return
-        clue = next_clue
-        if clue.id_ in game.daily_doubles:
-            await self.daily_double(ctx, clue)
-        else:
-            await self.play(ctx, clue, jeopardy_mode=True)
+        return next_clue
+
+
+    async def play_jeopardy(self, ctx, clue):
+        """
+        Plays clues one after another for as long as the leader keeps picking
+        the next one. Every clue is over before the next starts, so a whole
+        game holds on to no more than the clue being played.
+        """
+        channel = self.get_channel(ctx.channel.id)
+        game = channel['jeopardy']
+        # only the loop playing in the channel changes its state, not one turned away by play
+        loop = object()
+        try:
+            while clue is not None:
+                self.claim(channel, loop, 'question')
+                if clue.id_ in game.daily_doubles:
+                    question = await self.daily_double(ctx, clue)
+                else:
+                    question = await self.play(ctx, clue, jeopardy_mode=True)
+                if question is None:
+                    return
+                self.set_state(channel, loop, 'choosing')
+                clue = await self.end_jeopardy_clue(ctx, game, question, clue)
+        finally:
+            self.release(channel, loop)
+
+
+    async def play_infinite(self, ctx, clue):
+        """Plays the clue, then a random one after another while infinite mode is on and somebody asks."""
+        channel = self.get_channel(ctx.channel.id)
+        loop = object()
+        try:
+            while clue is not None:
+                self.claim(channel, loop, 'question')
+                question = await self.play(ctx, clue)
+                if question is None or not channel['infinite mode']:
+                    return
+                self.set_state(channel, loop, 'repeat')
+                user = await self.wait_for_repeat(ctx, question)
+                if user is None:
+                    return
+                logging.info(f"{user} asked for another clue", extra=context_fields(ctx))
+                self.set_state(channel, loop, 'question')
+                clue = await self.get_random_clue()
+                if clue is None:
+                    await ctx.send("I couldn't get a clue right now, try again in a bit.")
+        finally:
+            self.release(channel, loop)
+
+
+    async def wait_for_repeat(self, ctx, question):
+        def reactioncheck(reaction, user):
+            return (reaction.message.id == question.id and
+                    user.id != self.bot.user.id and
+                    reaction.emoji == '🔄')
+        await question.add_reaction("🔄")
+        try:
+            _, user = await self.waiters.wait_for(self, 'reaction_add', timeout=20.0, check=reactioncheck,
+                                                   channel_id=ctx.channel.id)
+        except asyncio.TimeoutError:
+            await question.remove_reaction("🔄", self.bot.user)
+            return None
+        return user
 
 
     async def play(self, ctx, clue, jeopardy_mode=False):
+        """Plays a single clue and returns the last message about it, None if the channel was busy."""
         channel = self.get_channel(ctx.channel.id)
         if channel['active']:
             await ctx.send("There's already an active question in this channel.")
@@ -484,26 +727,28 @@ class GameCog(commands.Cog):
         question = clue.question_to_str()
 
         question = await ctx.send(question)
-        clue.update_possible_answers()
-        # correctanswer = tag_re.sub('', clue.answer).lower()
-        # correctanswer = between_parentheses_re.sub('', correctanswer)
-        # correctanswer = non_letters_re.sub('', correctanswer)
+        self.client.served_clue()
 
         button_leader_id = None
         incorrect_answer_ids = []
         be_specific = False
+        # wrong guesses and the replies to them, deleted together in clean mode
+        deletions = Deletions(self.waiters, ctx.channel)
 
         def is_valid_answer(message):
-            return (message.channel == ctx.channel and
-                    message.content.lower().startswith(answer_starts) and
+            if message.channel != ctx.channel:
+                return False
+            envelope = parse_message(message)
+            return (envelope.is_answer and
                     (not (channel['button mode'] or jeopardy_mode) or button_leader_id == message.author.id) and
-                    (not jeopardy_mode or not message.content.lower().startswith("skip clue")))
+                    (not jeopardy_mode or not envelope.skip))
 
         question_start = datetime.utcnow()
         while True:
             if jeopardy_mode and not be_specific:
-                button_leader_id, button_leader_name = await self.button_check(question, incorrect_answer_ids, channel['jeopardy'].players)
+                button_leader_id, button_leader_name = await self.button_check(question, incorrect_answer_ids, channel['jeopardy'])
                 if button_leader_id is not None:
+                    self.record(ctx, 'buzz', button_leader_id, clue)
                     question = await ctx.send(f"{button_leader_name}, what's your answer?")
                 else:
                     question = await ctx.send(f"Time's up! The correct response was **{clue.answer}**.")
@@ -514,6 +759,7 @@ class GameCog(commands.Cog):
             elif channel['button mode']:
                 button_leader_id, button_leader_name = await self.button_check(question, [button_leader_id])
                 if button_leader_id is not None:
+                    self.record(ctx, 'buzz', button_leader_id, clue)
                     question = await ctx.send(f"{button_leader_name}, what's your answer?")
                 else:
                     question = await ctx.send(f"Time's up! The correct response was **{clue.answer}**.")
@@ -523,12 +769,14 @@ class GameCog(commands.Cog):
                 remainingtime = max(0.5, 52.5 - (datetime.utcnow() - question_start).total_seconds())
 
             try:
-                answer = await self.bot.wait_for('message', timeout=remainingtime,
-                                                 check=is_valid_answer)
+                answer = await self.waiters.wait_for(self, 'message', timeout=remainingtime,
+                                                     check=is_valid_answer, channel_id=ctx.channel.id)
             except asyncio.TimeoutError:
                 be_specific = False
                 if jeopardy_mode:
                     incorrect_answer_ids.append(button_leader_id)
+                if jeopardy_mode:
+                    self.record(ctx, 'answer', button_leader_id, clue, False, -clue.value)
                 if channel['button mode'] or (jeopardy_mode and len(incorrect_answer_ids) < len(channel['jeopardy'].players)):
                     question = await ctx.send("Time's up, somebody else?")
                     if jeopardy_mode:
@@ -543,16 +791,16 @@ class GameCog(commands.Cog):
 
 
 
-            answertext = answer.content.lower()
-            if answertext.startswith("skip clue"):
+            envelope = parse_message(answer)
+            if envelope.skip:
                 question = await ctx.send("Ok.")
                 break
 
-            answertext = answer_start_re.sub('', answertext, 1)
-            result = clue.is_correct_answer(answertext)
+            result = await grade_answer(clue.possible_answers, envelope.guess, self.similarity_ratio)
             if result:
                 question = await ctx.send("That's correct, {}. The correct response was **{}**.".format(
                                  answer.author.display_name, clue.answer))
+                self.record(ctx, 'answer', answer.author.id, clue, True, clue.value if jeopardy_mode else 0)
                 if jeopardy_mode:
                     await award_points(ctx, channel['jeopardy'], button_leader_id, clue.value)
                     channel['jeopardy'].leader_id = button_leader_id
@@ -564,6 +812,8 @@ class GameCog(commands.Cog):
                     if jeopardy_mode:
                         be_specific = True
                 else:
+                    self.record(ctx, 'answer', answer.author.id, clue, False,
+                                -clue.value if jeopardy_mode else 0)
                     if jeopardy_mode:
                         be_specific = False
                         incorrect_answer_ids.append(button_leader_id)
@@ -571,35 +821,16 @@ class GameCog(commands.Cog):
                             question = await ctx.send(f"That's incorrect, {answer.author.display_name}. The correct response was **{clue.answer}**.")
                             await award_points(ctx, channel['jeopardy'], button_leader_id, -clue.value)
                             break
-                    question = await ctx.send(f"That's incorrect, {answer.author.display_name}.",
-                                              delete_after=(2.0 if channel['clean mode'] else None))
+                    question = await ctx.send(f"That's incorrect, {answer.author.display_name}.")
+                    if channel['clean mode']:
+                        deletions.add(question)
                     if jeopardy_mode:
                         await award_points(ctx, channel['jeopardy'], button_leader_id, -clue.value)
                 if channel['clean mode']:
-                    try:
-                        await answer.delete()
-                    except discord.Forbidden:
-                        pass
+                    deletions.add(answer)
         channel['active'] = False
-        if jeopardy_mode:
-            await self.end_jeopardy_clue(ctx, channel['jeopardy'], question, clue)
-            return
-        if not channel['infinite mode']:
-            return
-        def reactioncheck(reaction, user):
-            return (reaction.message.id == question.id and
-                    user.id != self.bot.user.id and
-                    reaction.emoji == '🔄')
-        await question.add_reaction("🔄")
-        try:
-            _, user = await self.bot.wait_for('reaction_add', timeout=20.0, check=reactioncheck)
-        except asyncio.TimeoutError:
-            await question.remove_reaction("🔄", self.bot.user)
-        else:
-            # await question.remove_reaction("🔄", self.bot.user)
-            ctx.message.author = user
-            ctx.message.content = "repeat clue"
-            await self.clue.invoke(ctx)
+        await deletions.flush()
+        return question
 
     async def daily_double(self, ctx, clue):
         channel = self.get_channel(ctx.channel.id)
@@ -608,22 +839,28 @@ class GameCog(commands.Cog):
             return
         channel['active'] = True
         game = channel['jeopardy']
-        leader = channel.get_leader()
+        leader = game.get_leader()
         max_bet = max(leader['score'], (500 if game.game_round == 1 else 1000))
         def is_valid_bet(message):
             return (message.channel == ctx.channel and
                     leader['id'] == message.author.id and
-                    message.content.lower().startswith("bet ")
-                    )
+                    parse_message(message).is_bet)
 
         await ctx.send(f"You've found one of the Daily Doubles! Make a `bet` between $5 and ${max_bet}")
 
+        bet_start = datetime.utcnow()
         while True:
-            answer = await self.bot.wait_for('message', check=is_valid_bet)
-            bet = answer.content[4:]
+            remainingtime = 30.0 - (datetime.utcnow() - bet_start).total_seconds()
             try:
-                bet = int(bet)
-            except ValueError:
+                answer = await self.waiters.wait_for(self, 'message', check=is_valid_bet,
+                                                     timeout=max(0.5, remainingtime),
+                                                     channel_id=ctx.channel.id)
+            except asyncio.TimeoutError:
+                bet = 5
+                await ctx.send("Time's up for betting.")
+                break
+            bet = parse_message(answer).bet
+            if bet is None:
                 await ctx.send("That's not a valid bet.")
             else:
                 if 5 <= bet <= max_bet:
@@ -633,30 +870,31 @@ class GameCog(commands.Cog):
         question = clue.question_to_str()
 
         await ctx.send(question)
-        clue.update_possible_answers()
         def is_valid_answer(message):
-            return (message.channel == ctx.channel and
-                    message.content.lower().startswith(answer_starts) and
-                    leader['id'] == message.author.id and
-                    not message.content.lower().startswith("skip clue"))
+            if message.channel != ctx.channel or leader['id'] != message.author.id:
+                return False
+            envelope = parse_message(message)
+            return envelope.is_answer and not envelope.skip
 
         be_specific = False
 
         while True:
             try:
-                answer = await self.bot.wait_for('message',
-                                                 timeout=(15.0 if be_specific else 30.0),
-                                                 check=is_valid_answer)
+                answer = await self.waiters.wait_for(self, 'message',
+                                                     timeout=(15.0 if be_specific else 30.0),
+                                                     check=is_valid_answer, channel_id=ctx.channel.id)
             except asyncio.TimeoutError:
+                self.record(ctx, 'daily double', leader['id'], clue, False, -bet)
                 await award_points(ctx, channel['jeopardy'], leader['id'], -bet)
                 question = await ctx.send("Time's up! The correct response was "
                                     f"**{clue.answer}**.")
             else:
-                answertext = answer_start_re.sub('', answer.content.lower(), 1)
-                result = clue.is_correct_answer(answertext)
+                result = await grade_answer(clue.possible_answers, parse_message(answer).guess,
+                                            self.similarity_ratio)
                 if result:
                     question = await ctx.send("That's correct, {}. The correct response was **{}**.".format(
                                      answer.author.display_name, clue.answer))
+                    self.record(ctx, 'daily double', leader['id'], clue, True, bet)
                     await award_points(ctx, channel['jeopardy'], leader['id'], bet)
                 elif result is None and not be_specific:
                     await ctx.send(f"Be more specific, {answer.author.display_name}.")
@@ -664,10 +902,11 @@ class GameCog(commands.Cog):
                     continue
                 else:
                     question = await ctx.send(f"That's incorrect, {answer.author.display_name}. The correct response was **{clue.answer}**.")
+                    self.record(ctx, 'daily double', leader['id'], clue, False, -bet)
                     await award_points(ctx, channel['jeopardy'], leader['id'], -bet)
                 break
         channel['active'] = False
-        await self.end_jeopardy_clue(ctx, channel['jeopardy'], question, clue)
+        return question
 
 
     @commands.command()
@@ -678,30 +917,34 @@ class GameCog(commands.Cog):
             return
         if clue_id is None:
             clue = await self.get_random_clue()
+            if clue is None:
+                await ctx.send("I couldn't get a clue right now, try again in a bit.")
+                return
         else:
             try:
                 clue_id = int(clue_id)
             except ValueError:
                 await ctx.send("The id, if you're using it, needs to be a number.")
                 return
-            clue = await jservice_get_json(self.session, 'clues/{}.json'.format(clue_id))
+            clue = await jservice_get_json(self.client, 'clues/{}.json'.format(clue_id))
             if not clue:
                 await ctx.send("There's no clue with that id.")
                 return
+            get_clue_store().queue_clues([clue])
             if not is_valid_clue(clue, True, True):
                 await ctx.send("That doesn't seem to be a valid clue.")
                 return
             clue = Clue(**fix_id(clue))
-            category = await jservice_get_json(self.session, 'categories/{}.json'.format(clue.category_id))
-            clue.category_title = category['title'].upper()
+            clue.category_title = await self.get_category_title(clue.category_id)
 
-        await self.play(ctx, clue)
+        await self.play_infinite(ctx, clue)
 
     @commands.command()
-    async def find(self, ctx, cid='any', value='any'):
+    async def find(self, ctx, cid='any', value='any', era='any', size='any'):
         """
-        `find <category> <value>` gets a random clue from a certain category and with a certain value.
-        Use 'any' or a number for each of the arguments.
+        `find <category> <value> <era> <size>` gets a random clue from a certain category, with a certain value and from a certain era.
+        Use 'any' or a number for each of the arguments, the era can be a year or a range of years like 1990-1999.
+        The size is the least amount of clues the clue's category should have.
         """
 
         if self.get_channel(ctx.channel.id)['active']:
@@ -709,6 +952,8 @@ class GameCog(commands.Cog):
             return
         cid = cid.strip().lower()
         value = value.strip().lower()
+        era = era.strip().lower()
+        size = size.strip().lower()
 
         if cid != 'any':
             try:
@@ -722,40 +967,109 @@ class GameCog(commands.Cog):
             except ValueError:
                 await ctx.send("The value needs to be a number or `any`.")
                 return
-        if cid == 'any' and value == 'any':
-            clue = await self.get_random_clue()
-        elif cid == 'any': # and value!='any'
-            await ctx.send("You currently can't search for a value with no category specified, sorry.")
-        elif value == 'any' or value == 0: # and cid!='any'
-            category = await jservice_get_json(self.session, 'api/category',
-                                         {'id':cid})
-            if not category:
-                await ctx.send("That doesn't seem to be a valid category.")
+        min_date = max_date = None
+        if era != 'any':
+            first_year, _, last_year = era.partition('-')
+            try:
+                first_year = int(first_year)
+                last_year = int(last_year or first_year)
+            except ValueError:
+                await ctx.send("The era needs to be a year, a range of years like `1990-1999` or `any`.")
                 return
-            clues = [x for x in clues if is_valid_clue(x) and (value or not x['value'])]
-            clues = [Clue(**fix_id(clue)) for clue in clues]
-            if not clues:
-                if value == 0:
-                    await ctx.send("This category doesn't seem to have any valid clues with unknown value.")
-                else:
-                    await ctx.send("This category doesn't seem to have any valid clues.")
+            min_date = f'{first_year:04}-01-01'
+            max_date = f'{last_year:04}-12-31'
+        if size != 'any':
+            try:
+                size = int(size)
+            except ValueError:
+                await ctx.send("The size needs to be a number or `any`.")
                 return
-            clue = random.choice(clues)
-            clue.category_title = category['title'].upper()
-        else:   # cid != 'any' and value != 'any' and value != 0
-            category = await jservice_get_json(self.session, 'api/category',
-                                               {'id':cid})
-            # category = await jservice_get_json(self.session, 'api/clues', {'category':cid, 'value':value})
-            if category is None:
-                return await ctx.send("The search arrived to an unknown error.")
-            clues = [x for x in clues if is_valid_clue(x) and x['value'] == value]
-            clues = [Clue(**fix_id(clue)) for clue in category['clues']]
-            if not clues:
-                return await ctx.send("This category doesn't seem to have any valid clues with that category and value.")
-            clue = random.choice(clues)
-            clue.category_title = category['title'].upper()
+        if cid == 'any' and value == 'any' and era == 'any' and size == 'any':
+            clue = await self.get_random_clue()
+            if clue is None:
+                await ctx.send("The search arrived to an unknown error.")
+                return
+            await self.play_infinite(ctx, clue)
+            return
 
-        await self.play(ctx, clue)
+        filters = {'category_id': None if cid == 'any' else cid,
+                   'value': None if value == 'any' else value,
+                   'min_date': min_date, 'max_date': max_date,
+                   'min_category_size': None if size == 'any' else size}
+        store = get_clue_store()
+        if store.is_complete() or not self.client.breaker.allows_requests():
+            clue = store.sample(**filters)
+            if clue is None:
+                # the local store hasn't seen a matching clue yet, ask jservice
+                clue = await self.find_remote_clue(**filters)
+        else:
+            # the store only has the clues we came across, those alone would keep coming back
+            clue = await self.find_remote_clue(**filters)
+            if clue is None:
+                clue = store.sample(**filters)
+        if clue is None:
+            await ctx.send("There don't seem to be any valid clues with that category, value and era.")
+            return
+        clue = Clue(**fix_id(clue))
+        clue.category_title = await self.get_category_title(clue.category_id)
+        await self.play_infinite(ctx, clue)
+
+    async def find_remote_clue(self, category_id=None, value=None, min_date=None, max_date=None,
+                               min_category_size=None):
+        params = {}
+        if category_id is not None:
+            params['category'] = category_id
+        if value:
+            params['value'] = value
+        if min_date is not None:
+            params['min_date'] = min_date
+            params['max_date'] = max_date
+        clues = await self.get_remote_page(params)
+        if not clues:
+            return None
+        get_clue_store().queue_clues(clues)
+        clues = [clue for clue in clues if is_valid_clue(clue) and (value != 0 or not clue['value'])
+                 and (min_category_size is None
+                      or ((clue.get('category') or {}).get('clues_count') or 0) >= min_category_size)]
+        if not clues:
+            return None
+        clue = random.choice(clues)
+        return {key: clue[key] for key in CLUE_COLUMNS + ('possible_answers',)}
+
+    async def get_remote_page(self, params):
+        """
+        The clues of a random page of api/clues for the filters. Until the
+        last page turns up, every full page doubles how many there may be.
+        """
+        key = tuple(sorted(params.items()))
+        pages, last_seen = self.remote_pages.get(key, (1, False))
+        for _ in range(2):
+            page = random.randrange(pages)
+            clues = await jservice_get_json(self.client, 'api/clues',
+                                            {**params, 'offset': page * JSERVICE_PAGE})
+            if clues is None:
+                return None
+            if len(clues) < JSERVICE_PAGE:
+                pages, last_seen = max(1, page + bool(clues)), True
+            elif not last_seen:
+                pages = max(pages, (page + 1) * 2)
+            self.remote_pages[key] = (pages, last_seen)
+            self.remote_pages.move_to_end(key)
+            if len(self.remote_pages) > REMOTE_FILTERS:
+                self.remote_pages.popitem(last=False)
+            if clues:
+                return clues
+        return None
+
+    async def get_category_title(self, category_id):
+        title = get_clue_store().get_category_title(category_id)
+        if title is None:
+            category = await jservice_get_json(self.client, f'categories/{category_id}.json')
+            if not category:
+                return "NO CATEGORY"
+            get_clue_store().queue_category(category)
+            title = category['title']
+        return title.upper()
 
     async def togglemode(self, ctx, mode):
         channel = self.get_channel(ctx.channel.id)
@@ -799,34 +1113,51 @@ class GameCog(commands.Cog):
         return False
 
     async def get_random_category(self, game):
-        for _ in range(100):
-            category_id = random.randint(1, CATEGORY_AMOUNT)
-            if game.has_category(category_id):
-                continue
-            category = await jservice_get_json(self.session, 'api/category', {'id':category_id})
-            if not category:
-                continue
-            valid_clues = [x for x in category['clues'] if is_valid_clue(x) and (not game.final or game.final.id_ != x['id'])]
-            for i in range(len(valid_clues)-1, 0, -1):
-                question = valid_clues[i]['question'].lower()
-                for j in range(0, i):
-                    if question == valid_clues[j]['question'].lower():
-                        valid_clues.pop(i)
-                        break
-            if len(valid_clues) >= 5:
-                break
-        else:
-            return None, None
+        excluded = [category.id_ for category in game.categories if category]
+        if game.final:
+            excluded.append(game.final.category_id)
+        store = get_clue_store()
+        category = None
+        if store.prefers_remote_category():
+            # the store only knows the categories we came across, boards would keep repeating them
+            category, valid_clues = await self.get_remote_category(game)
+        if category is None:
+            category, valid_clues = store.sample_board_category(excluded)
+        if category is None:
+            # the store doesn't know enough categories yet
+            category, valid_clues = await self.get_remote_category(game)
+            if category is None:
+                return None, None
+        elif category['title'] is None:
+            category['title'] = await self.get_category_title(category['id'])
         clues = [None]*5
         category['title'] = category['title'].upper()
         for i in range(5):
             clue = valid_clues.pop(random.randint(0,len(valid_clues)-1))
             clues[i] = Clue(**fix_id(clue))
             clues[i].category_title = category['title']
-        del category['clues']
+        category.pop('clues', None)
         category = Category(**fix_id(category))
         return category, clues
 
+    async def get_remote_category(self, game):
+        for _ in range(100):
+            if not self.client.breaker.allows_requests():
+                return None, None
+            category_id = random.randint(1, CATEGORY_AMOUNT)
+            if game.has_category(category_id):
+                continue
+            category = await jservice_get_json(self.client, 'api/category', {'id':category_id})
+            if not category:
+                continue
+            get_clue_store().queue_clues(category['clues'], category)
+            valid_clues = [x for x in category['clues'] if is_valid_clue(x) and (not game.final or game.final.id_ != x['id'])]
+            playable = set(playable_clue_ids((clue['id'], clue['question']) for clue in valid_clues))
+            valid_clues = [clue for clue in valid_clues if clue['id'] in playable]
+            if len(valid_clues) >= BOARD_CATEGORY_SIZE:
+                return category, valid_clues
+        return None, None
+
     @jeopardy.command()
     async def autoadd(self, ctx):
         if await self.is_active_jeopardy(ctx) or await self.is_modifying_jeopardy(ctx):
@@ -837,8 +1168,11 @@ class GameCog(commands.Cog):
             await ctx.send("There are already 12 categories! You need to remove one before you add one.")
         else:
             category, clues = await self.get_random_category(game)
-            result = game.add_jeopardy_clues(category, clues)
-            await ctx.send(result)
+            if category is None:
+                await ctx.send("I couldn't find a category right now, try again in a bit.")
+            else:
+                result = game.add_jeopardy_clues(category, clues)
+                await ctx.send(result)
         game.modifying = False
 
     @jeopardy.command()
@@ -849,11 +1183,40 @@ class GameCog(commands.Cog):
         game.modifying = True
         while None in game.categories:
             category, clues = await self.get_random_category(game)
+            if category is None:
+                await ctx.send("I couldn't find a category right now, try again in a bit.")
+                game.modifying = False
+                return
             result = game.add_jeopardy_clues(category, clues)
             await ctx.send(result)
         await ctx.send("There are no more categories to add.")
         game.modifying = False
 
+    @jeopardy.command()
+    async def quickstart(self, ctx):
+        if await self.is_active_jeopardy(ctx) or await self.is_modifying_jeopardy(ctx):
+            return
+        game = self.get_channel(ctx.channel.id)['jeopardy']
+        if game.final or any(game.categories):
+            return await ctx.send("This game already has clues, clear it first if you want a new board.")
+        if self.boards:
+            board = self.boards.popleft()
+            metrics.increment('boards_used_total', source='pool')
+        elif get_clue_store().has_variety():
+            board = generate_board(get_clue_store())
+            metrics.increment('boards_used_total', source='store')
+        else:
+            # boards from the few categories the store knows would keep repeating
+            metrics.increment('boards_used_total', source='autofill')
+            await self.autofill(ctx)
+            if None not in game.categories:
+                await self.add_final(ctx)
+            return
+        if board is None:
+            return await ctx.send("I don't know enough categories for a whole board yet, try autofill instead.")
+        self.load_board(game, board)
+        await ctx.send(f"Added 12 categories and `{game.final.id_}` to **Final Jeopardy!**\n")
+
     @jeopardy.command()
     async def add(self, ctx, clue1:int, clue2:int, clue3:int, clue4:int, clue5:int):
         if await self.is_active_jeopardy(ctx) or await self.is_modifying_jeopardy(ctx):
@@ -877,19 +1240,25 @@ class GameCog(commands.Cog):
             return
         clues = [None]*5
         for i, clue_id in enumerate(clue_ids):
-            clue = await jservice_get_json(self.session, f'clues/{clue_id}.json')
+            clue = await jservice_get_json(self.client, f'clues/{clue_id}.json')
+            if clue:
+                get_clue_store().queue_clues([clue])
             if not clue or not is_valid_clue(clue):
                 await ctx.send(f"Clue number {i+1} (`{clue_id}`) is not a valid clue.")
                 break
             if i == 0:
-                category_id = clue.category_id
+                category_id = clue['category_id']
                 if game.has_category(category_id):
                     await ctx.send('That category has already been added.')
                     break
-                category = await jservice_get_json(self.session, f'categories/{category_id}.json')
+                category = await jservice_get_json(self.client, f'categories/{category_id}.json')
+                if not category or category.get('title') is None:
+                    await ctx.send(f"The category of those clues (`{category_id}`) is unavailable right now.")
+                    break
+                get_clue_store().queue_category(category)
                 category['title'] = category['title'].upper()
                 category = Category(**fix_id(category))
-            elif category_id != clue.category_id:
+            elif category_id != clue['category_id']:
                 await ctx.send(f"All clues should share the same category, clue number {i+1} (`{clue_id}`) doesn't have the same category as the previous clues.")
                 break
             elif game.final and clue['id'] == game.final.id_:
@@ -910,6 +1279,10 @@ class GameCog(commands.Cog):
         if clue_id is None:
             while True:
                 clue = await self.get_random_clue()
+                if clue is None:
+                    await ctx.send("I couldn't get a clue right now, try again in a bit.")
+                    game.modifying = False
+                    return
                 if not game.has_clue(clue.id_):
                     break
             clue.answered = False
@@ -926,14 +1299,16 @@ class GameCog(commands.Cog):
         if game.has_clue(clue_id):
             await ctx.send("That clue has already been added to this game!")
         else:
-            clue = await jservice_get_json(self.session, f'clues/{clue_id}.json')
+            clue = await jservice_get_json(self.client, f'clues/{clue_id}.json')
+            if clue:
+                get_clue_store().queue_clues([clue])
             if not clue:
                 await ctx.send("That clue doesn't exist!")
             elif not is_valid_clue(clue):
                 await ctx.send("That's not a valid clue.")
             else:
                 clue = Clue(**fix_id(clue))
-                category = await jservice_get_json(self.session, f"categories/{clue.category_id}.json")
+                category = await jservice_get_json(self.client, f"categories/{clue.category_id}.json")
                 if not category:
                     await ctx.send("Somehow that clue doesn't belong to a valid category.")
                 else:
@@ -983,6 +1358,7 @@ class GameCog(commands.Cog):
         if await self.is_active_jeopardy(ctx):
             return
         game = self.get_channel(ctx.channel.id)['jeopardy']
+        self.members.remember(ctx.author)
         player = game.add_player(player_id=ctx.author.id,
                                  name=ctx.author.display_name, score=0)
         if player:
@@ -1040,6 +1416,7 @@ class GameCog(commands.Cog):
         if not await self.is_active_jeopardy(ctx, False):
             await ctx.send("There's no game currently active.")
             return
+        self.stop_waiting(ctx.channel.id)
         self.get_channel(ctx.channel.id)['jeopardy'].end()
         await ctx.send("The game has been cancelled.")
 
@@ -1109,7 +1486,12 @@ class GameCog(commands.Cog):
         for player in game.players:
             if player['score'] <= 0:
                 continue
-            info = await self.bot.get_user(player['id'])
+            if ctx.guild is None:
+                info = await self.members.fetch_user(self.bot, player['id'])
+            else:
+                info = await self.members.fetch(ctx.guild, player['id'])
+            if info is None:
+                continue
             players[player['id']] = {'bet':0, 'info':info, 'score':player['score'], 'answer':None}
         if not players:
             await ctx.send("Nobody has money for **Final Jeopardy!** The game is over.")
@@ -1123,20 +1505,18 @@ class GameCog(commands.Cog):
         def is_valid_bet(message):
             return (message.author.id in players and
                     type(message.channel) == discord.DMChannel and
-                    message.content.lower().startswith("bet ")
-                    )
+                    parse_message(message).is_bet)
         bet_start = datetime.utcnow()
 
         remainingtime = 30.0
         while remainingtime > 0:
             try:
-                answer = await self.bot.wait_for('message', check=is_valid_bet, timeout=remainingtime)
+                answer = await self.waiters.wait_for(self, 'message', check=is_valid_bet,
+                                                     timeout=remainingtime, channel_id=ctx.channel.id)
             except asyncio.TimeoutError:
                 break
-            bet = answer.content[4:]
-            try:
-                bet = int(bet)
-            except ValueError:
+            bet = parse_message(answer).bet
+            if bet is None:
                 await answer.author.send("That's not a valid bet.")
             else:
                 if 0 <= bet <= players[answer.author.id]['score']:
@@ -1158,12 +1538,11 @@ class GameCog(commands.Cog):
 
         clue = game.final
 
-        clue.update_possible_answers()
         def is_valid_answer(message):
-            return (message.author.id in players and
-                    type(message.channel) == discord.DMChannel and
-                    message.content.lower().startswith(answer_starts) and
-                    not message.content.lower().startswith("skip clue"))
+            if message.author.id not in players or type(message.channel) != discord.DMChannel:
+                return False
+            envelope = parse_message(message)
+            return envelope.is_answer and not envelope.skip
 
         question = clue.question_to_str()
 
@@ -1176,12 +1555,13 @@ class GameCog(commands.Cog):
         bet_start = datetime.utcnow()
         while remainingtime > 0:
             try:
-                answer = await self.bot.wait_for('message',
-                                                 timeout=remainingtime,
-                                                 check=is_valid_answer)
+                answer = await self.waiters.wait_for(self, 'message',
+                                                     timeout=remainingtime,
+                                                     check=is_valid_answer, channel_id=ctx.channel.id)
             except asyncio.TimeoutError:
                 break
             players[answer.author.id]['answer'] = answer.content
+            players[answer.author.id]['guess'] = parse_message(answer).guess
             await answer.author.send("Got it.")
             remainingtime = max(0.5, 40 - (datetime.utcnow() - bet_start).total_seconds())
         bet_message = "Time's up, let's check how everyone answered."
@@ -1191,13 +1571,20 @@ class GameCog(commands.Cog):
         def sort_key(player_id):
             return players[player_id]['score']
         sorted_players = sorted(list(players), key=sort_key)
+        guesses = [player for player in sorted_players if players[player]['answer']]
+        results = await grade_many([(clue.possible_answers, players[player]['guess'])
+                                    for player in guesses],
+                                   budget=5.0, similarity_ratio=self.similarity_ratio)
+        results = dict(zip(guesses, results))
         for player in sorted_players:
             result = f"{players[player]['info'].display_name}, you "
             answer = players[player]['answer']
             if answer:
                 result += f"guessed {answer}... "
                 await ctx.send(result)
-                if clue.is_correct_answer(answer):
+                self.record(ctx, 'final', player, clue, bool(results[player]),
+                            players[player]['bet'] if results[player] else -players[player]['bet'])
+                if results[player]:
                     await ctx.send("That is correct.")
                     await ctx.send(f"You also bet ${players[player]['bet']}.")
                     await award_points(ctx, game, player, players[player]['bet'])
@@ -1207,6 +1594,7 @@ class GameCog(commands.Cog):
                     await award_points(ctx, game, player, -players[player]['bet'])
             else:
                 result += f"did not make a guess."
+                self.record(ctx, 'final', player, clue, False, -players[player]['bet'])
                 await ctx.send(result)
                 await ctx.send(f"You also bet ${players[player]['bet']}.")
                 await award_points(ctx, game, player, -players[player]['bet'])
@@ -1233,7 +1621,7 @@ class GameCog(commands.Cog):
     async def award(self, ctx, player:discord.Member, money:int):
         if ctx.author.id == player.id:
             await ctx.send("You can't award money to yourself.")
-        elif self.get_channel(ctx.channel.id)['jeopardy'].has_player(player.id) is None:
+        elif not self.get_channel(ctx.channel.id)['jeopardy'].has_player(player.id):
             await ctx.send("That's not one of the players.")
         else:
             await award_points(ctx, self.get_channel(ctx.channel.id)['jeopardy'], player.id, money)
@@ -1313,10 +1701,7 @@ class GameCog(commands.Cog):
         if clue.answered:
             await ctx.send("That clue has already been answered.")
             return
-        if clue.id_ in game.daily_doubles:
-            await self.daily_double(ctx, clue)
-        else:
-            await self.play(ctx, clue, jeopardy_mode=True)
+        await self.play_jeopardy(ctx, clue)
 
 
 def setup(bot):
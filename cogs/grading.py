@@ -0,0 +1,209 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from difflib import SequenceMatcher
+from cogs.metrics import metrics
+
+try:
+    from rapidfuzz.process import cpdist
+except ImportError:
+    cpdist = None
+
+tag_re = re.compile(r'<[^>]*>')
+between_parentheses_re = re.compile(r'\([^\)]*\)')
+parentheses_re = re.compile(r'[()]')
+
+SIMILARITY_RATIO = 0.65
+# below this many character comparisons grading inline is cheaper than a trip to the pool
+INLINE_COST = 4000
+BATCH_SIZE = 64
+
+executor = None
+
+
+def start_executor():
+    """
+    The grading pool, started when the bot starts. Its workers come from a
+    fork server or are spawned, forking the bot would copy the locks its
+    logging and executor threads hold.
+    """
+    global executor
+    if executor is None:
+        workers = int(os.environ.get('GRADING_WORKERS', min(4, os.cpu_count() or 1)))
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                          mp_context=multiprocessing.get_context(method))
+    return executor
+
+
+def get_executor():
+    return executor or start_executor()
+
+
+def restart_executor():
+    """Replaces a pool one of whose workers died, which fails everything sent to it from then on."""
+    global executor
+    if executor is not None:
+        executor.shutdown(wait=False)
+        executor = None
+    logging.error("The grading pool broke, starting a new one")
+    metrics.increment('grading_pool_restarts_total')
+    return start_executor()
+
+
+def parse_answers(answer):
+    """
+    The forms of a clue's answer guesses are graded against: lowercase and
+    without tags, with and without what's in parentheses, and as a number
+    when it is one. Empty if nothing is left of the answer.
+    """
+    answer = tag_re.sub('', answer or '').strip().lower()
+    if not answer:
+        return []
+    if answer[0] == "(":
+        answers = [between_parentheses_re.sub('', answer),
+                   parentheses_re.sub('', answer)]
+    elif answer[-1] == ")":
+        start = answer.find("(")
+        if answer[start+1:].startswith("or "):
+            answers = [answer[:start], answer[start+4:-1]]
+        else:
+            answers = [between_parentheses_re.sub('', answer),
+                       parentheses_re.sub('', answer)]
+    else:
+        answers = [answer]
+    for i in range(len(answers)):
+        try:
+            answers[i] = int(answers[i])
+        except ValueError:
+            pass
+    return answers
+
+
+def grade(possible_answers, answer, similarity_ratio=SIMILARITY_RATIO):
+    """
+    True if the answer matches one of the possible answers, None if it's
+    only some of the words of one of them and False otherwise.
+    """
+    close_answer = False
+    for correct_answer in possible_answers:
+        if isinstance(correct_answer, int):
+            try:
+                if int(answer) == correct_answer:
+                    return True
+            except ValueError:
+                pass
+        elif similarity_ratio <= SequenceMatcher(None, correct_answer,
+                                                 answer).ratio():
+            return True
+        elif not close_answer:
+            for word in answer.split():
+                if not re.search(rf'\b{re.escape(word)}\b', correct_answer):
+                    break
+            else:
+                close_answer = True
+    if close_answer:
+        return None
+    else:
+        return False
+
+
+def grade_exact(possible_answers, answer):
+    """The cheap fallback when a batch runs out of time: only exact matches count."""
+    for correct_answer in possible_answers:
+        if isinstance(correct_answer, int):
+            if answer.strip().isdigit() and int(answer) == correct_answer:
+                return True
+        elif correct_answer.strip() == answer.strip():
+            return True
+    return False
+
+
+def grade_batch(pairs, similarity_ratio=SIMILARITY_RATIO, vectorized=False):
+    """Grades (possible_answers, answer) pairs in order. Runs inside the pool."""
+    if not vectorized or cpdist is None:
+        return [grade(possible_answers, answer, similarity_ratio)
+                for possible_answers, answer in pairs]
+    results = [None] * len(pairs)
+    # score every text answer against its guess in one call, then fall back
+    # to the usual rules for whatever didn't clear the ratio, rapidfuzz's
+    # ratio is close to but not the same as SequenceMatcher's
+    texts = [(i, correct_answer) for i, (possible_answers, _) in enumerate(pairs)
+             for correct_answer in possible_answers if isinstance(correct_answer, str)]
+    scores = cpdist([pairs[i][1] for i, _ in texts], [text for _, text in texts],
+                    score_cutoff=similarity_ratio * 100)
+    matched = {texts[j][0] for j in range(len(texts)) if scores[j]}
+    for i, (possible_answers, answer) in enumerate(pairs):
+        results[i] = True if i in matched else grade(possible_answers, answer, similarity_ratio)
+    return results
+
+
+def grading_cost(pairs):
+    return sum(len(answer) * sum(len(str(correct_answer)) for correct_answer in possible_answers)
+               for possible_answers, answer in pairs)
+
+
+async def grade_many(pairs, budget=None, similarity_ratio=SIMILARITY_RATIO, vectorized=False):
+    """
+    Grades many (possible_answers, answer) pairs off the event loop and
+    returns the results in the same order. Batches that aren't back within
+    budget seconds are graded by exact match instead.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return []
+    start = time.perf_counter()
+    if grading_cost(pairs) <= INLINE_COST:
+        results = grade_batch(pairs, similarity_ratio)
+        metrics.observe('grading_batch_seconds', time.perf_counter() - start, where='inline')
+        return results
+
+    loop = asyncio.get_event_loop()
+    chunks = [pairs[i:i+BATCH_SIZE] for i in range(0, len(pairs), BATCH_SIZE)]
+    try:
+        futures = [loop.run_in_executor(get_executor(), grade_batch, chunk,
+                                        similarity_ratio, vectorized)
+                   for chunk in chunks]
+    except BrokenProcessPool:
+        restart_executor()
+        futures = [loop.run_in_executor(get_executor(), grade_batch, chunk,
+                                        similarity_ratio, vectorized)
+                   for chunk in chunks]
+    done, pending = await asyncio.wait(futures, timeout=budget)
+    results = []
+    failed = 0
+    broken = False
+    for chunk, future in zip(chunks, futures):
+        if future in done and not future.exception():
+            results.extend(future.result())
+        else:
+            if future in done:
+                failed += 1
+                broken = broken or isinstance(future.exception(), BrokenProcessPool)
+                if not broken:
+                    logging.error("Grading a batch failed", exc_info=future.exception())
+            future.cancel()
+            results.extend(grade_exact(possible_answers, answer)
+                           for possible_answers, answer in chunk)
+    if pending:
+        metrics.increment('grading_budget_exceeded_total')
+        logging.warning(f"Grading {len(pairs)} answers went over its {budget}s budget, "
+                        f"{len(pending)} of {len(chunks)} batches were graded by exact match")
+    if broken:
+        restart_executor()
+    if failed:
+        metrics.increment('grading_failures_total', failed)
+        logging.warning(f"{failed} of {len(chunks)} batches failed and were graded by exact match")
+    metrics.observe('grading_batch_seconds', time.perf_counter() - start, where='pool')
+    return results
+
+
+async def grade_answer(possible_answers, answer, similarity_ratio=SIMILARITY_RATIO):
+    result, = await grade_many([(possible_answers, answer)],
+                               similarity_ratio=similarity_ratio)
+    return result
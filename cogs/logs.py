@@ -0,0 +1,70 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+
+STRUCTURED_FIELDS = ('guild', 'channel', 'author', 'command', 'latency', 'outcome',
+                     'endpoint', 'status', 'params')
+
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per line, with any structured fields passed through `extra`."""
+
+    def format(self, record):
+        entry = {'time': self.formatTime(record), 'level': record.levelname,
+                 'logger': record.name, 'message': record.getMessage()}
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value if isinstance(value, (int, float)) else str(value)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class EnqueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler formats the message before enqueueing it, this leaves all
+    the work to the writer thread so logging on the event loop is just a put.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def context_fields(ctx):
+    """The structured fields describing where a command was used."""
+    return {'guild': ctx.guild and ctx.guild.id, 'channel': ctx.channel.id,
+            'author': ctx.author.id,
+            'command': ctx.command and ctx.command.qualified_name}
+
+
+def setup_logging(filename='jeopardy.log', level=logging.INFO):
+    """
+    Sends every log record through a queue to a background thread that
+    writes them to a rotating file. LOG_ROTATE_WHEN (like 'midnight') rotates
+    by time, otherwise files are rotated at LOG_MAX_BYTES.
+    """
+    when = os.environ.get('LOG_ROTATE_WHEN')
+    backups = int(os.environ.get('LOG_BACKUPS', 5))
+    if when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(filename, when=when,
+                                                                 backupCount=backups,
+                                                                 encoding='utf-8')
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+            backupCount=backups, encoding='utf-8')
+    file_handler.setFormatter(StructuredFormatter())
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler,
+                                              respect_handler_level=True)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(EnqueueHandler(log_queue))
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
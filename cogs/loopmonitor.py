@@ -0,0 +1,119 @@
+import asyncio
+import os
+import time
+import logging
+import collections
+from cogs.metrics import metrics
+
+# discord.py complains once the heartbeat has been blocked for 10 seconds,
+# so shout well before that
+LAG_ALERT = 2.5
+SLOW_CALLBACK = 0.05
+ASYNCIO_DIRECTORY = os.path.dirname(asyncio.__file__)
+
+
+def describe_handle(handle):
+    """Where a slow callback came from: the task's coroutine and where it stopped, if it's a task."""
+    callback = getattr(handle, '_callback', None)
+    task = getattr(callback, '__self__', None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        code = getattr(coro, 'cr_code', None)
+        if code is None:
+            return repr(task)
+        origin = f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'
+        # follow the awaits down to the innermost coroutine of ours, where it paused next
+        frame = coro.cr_frame
+        while getattr(getattr(coro, 'cr_await', None), 'cr_frame', None) is not None:
+            coro = coro.cr_await
+            if not coro.cr_frame.f_code.co_filename.startswith(ASYNCIO_DIRECTORY):
+                frame = coro.cr_frame
+        if frame is not None:
+            origin += f' until {frame.f_code.co_name} ({frame.f_code.co_filename}:{frame.f_lineno})'
+        return origin
+    return repr(handle)
+
+
+class LoopMonitor:
+    """
+    Measures how late the event loop wakes up from a short sleep, and times
+    every callback the loop runs, keeping the slowest ones with their origin.
+    """
+
+    def __init__(self, interval=0.25, history=2400, slow_callback=SLOW_CALLBACK,
+                 lag_alert=LAG_ALERT):
+        self.interval = interval
+        self.lags = collections.deque(maxlen=history)
+        self.slow_callbacks = collections.deque(maxlen=50)
+        self.slow_callback = slow_callback
+        self.lag_alert = lag_alert
+        self.task = None
+        self.original_run = None
+
+
+    def start(self, loop=None):
+        loop = loop or asyncio.get_event_loop()
+        self.task = loop.create_task(self.measure_lag())
+        self.original_run = asyncio.Handle._run
+        monitor = self
+        original_run = self.original_run
+
+        def timed_run(handle):
+            start = time.perf_counter()
+            original_run(handle)
+            elapsed = time.perf_counter() - start
+            if elapsed >= monitor.slow_callback:
+                monitor.record_slow_callback(handle, elapsed)
+
+        asyncio.Handle._run = timed_run
+
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.original_run is not None:
+            asyncio.Handle._run = self.original_run
+            self.original_run = None
+
+
+    def record_slow_callback(self, handle, elapsed):
+        origin = describe_handle(handle)
+        self.slow_callbacks.append((time.time(), elapsed, origin))
+        metrics.increment('slow_callbacks_total')
+        if elapsed >= self.lag_alert:
+            logging.warning(f"Event loop blocked for {elapsed:.2f}s by {origin}, "
+                            "the gateway heartbeat is at risk")
+
+
+    async def measure_lag(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.lags.append(lag)
+            metrics.observe('loop_lag_seconds', lag)
+            if lag >= self.lag_alert:
+                logging.warning(f"Event loop lag of {lag:.2f}s, the gateway heartbeat is at risk")
+
+
+    def percentile(self, fraction):
+        if not self.lags:
+            return 0.0
+        lags = sorted(self.lags)
+        return lags[min(len(lags) - 1, int(fraction * len(lags)))]
+
+
+    def report(self):
+        result = (f'Loop lag over the last {len(self.lags) * self.interval / 60:.1f} minutes: '
+                  f'max={max(self.lags, default=0.0) * 1000:.1f}ms '
+                  f'p50={self.percentile(0.5) * 1000:.1f}ms '
+                  f'p95={self.percentile(0.95) * 1000:.1f}ms '
+                  f'p99={self.percentile(0.99) * 1000:.1f}ms\n')
+        if not self.slow_callbacks:
+            return result + 'No slow callbacks.\n'
+        result += f'Slowest recent callbacks (over {self.slow_callback * 1000:.0f}ms):\n'
+        for when, elapsed, origin in sorted(self.slow_callbacks, key=lambda x: -x[1])[:10]:
+            ago = time.time() - when
+            result += f'{elapsed * 1000:.0f}ms {ago:.0f}s ago: {origin}\n'
+        return result
@@ -0,0 +1,100 @@
+import discord
+
+import os
+import logging
+import collections
+from cogs.metrics import metrics
+
+# LAZY_MEMBERS=1 runs without discord.py's member cache, these many members
+# the bot has used lately are kept instead
+MEMBER_CACHE = int(os.environ.get('MEMBER_CACHE', 10000))
+
+
+def lazy_members():
+    return os.environ.get('LAZY_MEMBERS') == '1'
+
+
+def member_cache_options():
+    """Keyword arguments for the bot that turn off caching and chunking every member."""
+    if not lazy_members():
+        return {}
+    return {'member_cache_flags': discord.MemberCacheFlags.none(), 'chunk_guilds_at_startup': False}
+
+
+class MemberCache:
+    """
+    The members the game and role cogs have used lately, least recently
+    used first. Guilds still hold every member unless the bot runs with
+    LAZY_MEMBERS, then the ones missing here are fetched from Discord.
+    Keeping a member also keeps its user in the bot's user cache.
+    """
+
+    def __init__(self, size=MEMBER_CACHE):
+        self.size = size
+        self.members = collections.OrderedDict()
+
+
+    def remember(self, member):
+        if getattr(member, 'guild', None) is None:
+            return member
+        key = (member.guild.id, member.id)
+        self.members[key] = member
+        self.members.move_to_end(key)
+        if len(self.members) > self.size:
+            self.members.popitem(last=False)
+        return member
+
+
+    def get(self, guild, user_id):
+        member = self.members.get((guild.id, user_id))
+        if member is not None:
+            self.members.move_to_end((guild.id, user_id))
+            return member
+        member = guild.get_member(user_id)
+        return member and self.remember(member)
+
+
+    async def fetch(self, guild, user_id):
+        """The member from the cache or else from Discord, None if they left the guild or it failed."""
+        member = self.get(guild, user_id)
+        if member is not None:
+            metrics.increment('member_lookups_total', outcome='cached')
+            return member
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            metrics.increment('member_lookups_total', outcome='missing')
+            return None
+        except discord.HTTPException as e:
+            # one lookup failing shouldn't stop whatever needs the other members
+            logging.warning(f"Couldn't fetch member {user_id} of guild {guild.id}: {e}")
+            metrics.increment('member_lookups_total', outcome='failed')
+            return None
+        metrics.increment('member_lookups_total', outcome='fetched')
+        return self.remember(member)
+
+
+    async def fetch_user(self, client, user_id):
+        """The user from the client's cache or else from Discord, for games outside of guilds."""
+        user = client.get_user(user_id)
+        if user is not None:
+            metrics.increment('member_lookups_total', outcome='cached')
+            return user
+        try:
+            user = await client.fetch_user(user_id)
+        except discord.NotFound:
+            metrics.increment('member_lookups_total', outcome='missing')
+            return None
+        except discord.HTTPException as e:
+            logging.warning(f"Couldn't fetch user {user_id}: {e}")
+            metrics.increment('member_lookups_total', outcome='failed')
+            return None
+        metrics.increment('member_lookups_total', outcome='fetched')
+        return user
+
+
+def get_member_cache(bot):
+    members = getattr(bot, 'member_cache', None)
+    if members is None:
+        members = bot.member_cache = MemberCache()
+    return members
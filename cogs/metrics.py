@@ -0,0 +1,128 @@
+import time
+import bisect
+from contextlib import contextmanager
+
+# seconds, roughly doubling from 1ms to 1 minute
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+
+    def percentile(self, fraction):
+        """Estimates a percentile by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for i, amount in enumerate(self.counts):
+            if seen + amount >= rank and amount:
+                low = self.buckets[i-1] if i else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(low + (high - low) * (rank - seen) / amount, self.max)
+            seen += amount
+        return self.max
+
+
+class Metrics:
+    """
+    Process-wide counters and latency histograms, keyed by metric name
+    and a tuple of (label, value) pairs.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+
+    def observe(self, name, value, **labels):
+        key = self.key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+
+    def increment(self, name, amount=1, **labels):
+        key = self.key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+
+    def set_gauge(self, name, value, **labels):
+        self.gauges[self.key(name, labels)] = value
+
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+
+    def summary(self, prefix=''):
+        """One line per histogram whose name starts with prefix, slowest first."""
+        lines = []
+        for (name, labels), histogram in self.histograms.items():
+            if not name.startswith(prefix):
+                continue
+            labels = ' '.join(f'{value}' for _, value in labels)
+            lines.append((histogram.percentile(0.95),
+                          f'{name} {labels}: n={histogram.count} '
+                          f'mean={histogram.sum / histogram.count * 1000:.1f}ms '
+                          f'p50={histogram.percentile(0.5) * 1000:.1f}ms '
+                          f'p95={histogram.percentile(0.95) * 1000:.1f}ms '
+                          f'max={histogram.max * 1000:.1f}ms'))
+        lines.sort(reverse=True)
+        return [line for _, line in lines]
+
+
+    def to_prometheus(self):
+        result = []
+        for (name, labels), value in sorted(self.counters.items()):
+            result.append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), value in sorted(self.gauges.items()):
+            result.append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bucket, amount in zip(histogram.buckets, histogram.counts):
+                cumulative += amount
+                result.append(f'{name}_bucket{format_labels(labels + (("le", bucket),))} {cumulative}')
+            result.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+            result.append(f'{name}_sum{format_labels(labels)} {histogram.sum}')
+            result.append(f'{name}_count{format_labels(labels)} {histogram.count}')
+        return '\n'.join(result) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    labels = ','.join('{}="{}"'.format(label, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                      for label, value in labels)
+    return '{' + labels + '}'
+
+
+metrics = Metrics()
@@ -0,0 +1,230 @@
+from discord.ext import commands, tasks
+
+import os
+import time
+import logging
+from cogs.metrics import metrics
+from cogs.loopmonitor import LoopMonitor
+from cogs.logs import context_fields
+
+
+def write_file(path, text):
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as f:
+        f.write(text)
+    os.replace(temporary_path, path)
+
+
+class MonitoringCog(commands.Cog):
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.metrics_path = os.environ.get('METRICS_FILE', 'metrics.prom')
+        self.original_request = bot.http.request
+        bot.http.request = self.timed_request
+        self.write_metrics.start()
+        self.loop_monitor = LoopMonitor()
+        self.loop_monitor.start(bot.loop)
+        self.exported = False
+
+
+    def cog_unload(self):
+        self.bot.http.request = self.original_request
+        self.write_metrics.cancel()
+        if not self.exported:
+            self.loop_monitor.stop()
+
+
+    def export_state(self):
+        self.exported = True
+        return {'loop_monitor': self.loop_monitor}
+
+
+    def adopt_state(self, state):
+        # stopping the new monitor puts back the old one's callback timing, and it keeps its history
+        self.loop_monitor.stop()
+        self.loop_monitor = state['loop_monitor']
+
+
+    async def timed_request(self, route, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await self.original_request(route, **kwargs)
+        finally:
+            metrics.observe('discord_request_seconds', time.perf_counter() - start,
+                            method=route.method, route=route.path)
+
+
+    @commands.Cog.listener()
+    async def on_command(self, ctx):
+        ctx.invoked_at = time.perf_counter()
+
+
+    def record_command(self, ctx, outcome):
+        invoked_at = getattr(ctx, 'invoked_at', None)
+        if invoked_at is None or ctx.command is None:
+            return
+        command = ctx.command.qualified_name
+        latency = time.perf_counter() - invoked_at
+        metrics.observe('command_seconds', latency, command=command)
+        metrics.increment('commands_total', command=command, outcome=outcome)
+        logging.info(f'{command} finished', extra={**context_fields(ctx), 'latency': latency,
+                                                   'outcome': outcome})
+
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx):
+        self.record_command(ctx, 'ok')
+
+
+    @commands.Cog.listener()
+    async def on_command_error(self, ctx, error):
+        if isinstance(error, commands.CommandInvokeError):
+            error = error.original
+        self.record_command(ctx, type(error).__name__)
+        # any listener here stops the bot's default handler from printing the traceback
+        if hasattr(ctx.command, 'on_error'):
+            return
+        if ctx.cog and commands.Cog._get_overridden_method(ctx.cog.cog_command_error) is not None:
+            return
+        logging.error(f'Ignoring exception in command {ctx.command}', exc_info=error,
+                      extra=context_fields(ctx))
+
+
+    @tasks.loop(seconds=60.0)
+    async def write_metrics(self):
+        for shard_id, latency in self.shard_latencies():
+            metrics.observe('gateway_latency_seconds', latency, shard=shard_id)
+        waiters = getattr(self.bot, 'waiters', None)
+        if waiters is not None:
+            metrics.set_gauge('waits', len(waiters.waits))
+            metrics.set_gauge('background_tasks', len(waiters.tasks))
+            waiters.log_leaks()
+        client = getattr(self.bot, 'jservice_client', None)
+        if client is not None:
+            for name, value in client.pool_stats().items():
+                metrics.set_gauge('jservice_pool_connections', value, state=name)
+            metrics.set_gauge('jservice_requests_per_clue', client.requests_per_clue())
+            if client.clues_served:
+                discord_requests = sum(histogram.count for (name, _), histogram in metrics.histograms.items()
+                                       if name == 'discord_request_seconds')
+                metrics.set_gauge('discord_requests_per_clue', discord_requests / client.clues_served)
+        try:
+            await self.bot.loop.run_in_executor(None, write_file, self.metrics_path,
+                                                metrics.to_prometheus())
+        except OSError as e:
+            logging.warning(f"Couldn't write metrics to {self.metrics_path}: {e}")
+
+
+    @commands.command(name='metrics', hidden=True)
+    @commands.is_owner()
+    async def show_metrics(self, ctx, prefix=''):
+        """Latency histograms, slowest first. Filter them with a name prefix like command or jservice."""
+        lines = metrics.summary(prefix)
+        if not lines:
+            return await ctx.send("Nothing has been measured yet.")
+        result = ''
+        for line in lines:
+            if len(result) + len(line) > 1900:
+                await ctx.send(f'```\n{result}```')
+                result = ''
+            result += line + '\n'
+        await ctx.send(f'```\n{result}```')
+
+
+    def shard_latencies(self):
+        if self.bot.shard_count is None:
+            return [(0, self.bot.latency)]
+        return [(shard_id, latency) for shard_id, latency in self.bot.latencies
+                if latency == latency]  # nan until the first heartbeat
+
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def shards(self, ctx):
+        """Health and heartbeat latency of every shard in this process."""
+        if self.bot.shard_count is None:
+            return await ctx.send(f"Not sharded, {len(self.bot.guilds)} guilds, {self.bot.latency * 1000:.0f}ms.")
+        guilds = {}
+        for guild in self.bot.guilds:
+            guilds[guild.shard_id] = guilds.get(guild.shard_id, 0) + 1
+        result = f'Process {os.getpid()} runs {len(self.bot.shards)} of {self.bot.shard_count} shards.\n'
+        for shard_id, shard in sorted(self.bot.shards.items()):
+            if shard.is_closed():
+                state = 'closed'
+            elif shard.is_ws_ratelimited():
+                state = 'rate limited'
+            else:
+                state = 'ok'
+            result += (f'Shard {shard_id}: {state}, {guilds.get(shard_id, 0)} guilds, '
+                       f'{shard.latency * 1000:.0f}ms\n')
+        await ctx.send(f'```\n{result[:1900]}```')
+
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def pool(self, ctx):
+        """Connection pool use and request outcomes of the shared jservice client."""
+        client = getattr(self.bot, 'jservice_client', None)
+        if client is None:
+            return await ctx.send("Nothing is using the jservice client.")
+        stats = client.pool_stats()
+        result = (f"{stats['in_use']} of {stats['limit']} connections in use, "
+                  f"{stats['waiting']} requests waiting, {client.users} cogs using the client.\n")
+        for (name, labels), value in sorted(metrics.counters.items()):
+            if name in ('jservice_requests_total', 'jservice_retries_total'):
+                labels = ' '.join(f'{label}={label_value}' for label, label_value in labels)
+                result += f'{name} {labels}: {value}\n'
+        await ctx.send(f'```\n{result[:1900]}```')
+
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def breaker(self, ctx):
+        """State of the jservice circuit breaker and how often we've fallen back."""
+        client = getattr(self.bot, 'jservice_client', None)
+        if client is None:
+            return await ctx.send("Nothing is using the jservice client.")
+        await ctx.send(client.breaker_report()[:2000])
+
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def channels(self, ctx):
+        """How many game channels are kept in memory, evicted and saved."""
+        game = self.bot.get_cog('GameCog')
+        if game is None:
+            return await ctx.send("The game isn't loaded.")
+        await ctx.send(game.channels_report()[:2000])
+
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def waiters(self, ctx):
+        """Interactive waits and background tasks, the oldest and any past their deadline first."""
+        waiters = getattr(self.bot, 'waiters', None)
+        if waiters is None:
+            return await ctx.send("Nothing has waited yet.")
+        await ctx.send(f'```\n{waiters.report()[:1900]}```')
+
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def startup(self, ctx):
+        """How long each phase of the last start took."""
+        timer = getattr(self.bot, 'startup', None)
+        if timer is None:
+            return await ctx.send("Startup wasn't timed.")
+        await ctx.send(timer.report()[:2000])
+
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def lag(self, ctx):
+        """Recent event loop lag and the slowest callbacks that caused it."""
+        report = self.loop_monitor.report()
+        await ctx.send(f'```\n{report[:1900]}```')
+
+
+def setup(bot):
+    bot.add_cog(MonitoringCog(bot))
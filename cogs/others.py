@@ -1,14 +1,16 @@
 import discord
 from discord.ext import commands
 from difflib import SequenceMatcher
+import logging
+from cogs.logs import context_fields
 
 class OthersCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.owner = None
 
-    async def __before_invoke(self, ctx):
-        print("{0.guild} #{0.channel.id}, {0.author}: {0.content}".format(ctx.message))
+    async def cog_before_invoke(self, ctx):
+        logging.info(ctx.message.content, extra=context_fields(ctx))
 
     @commands.command()
     async def compare(self, ctx, a:str, b:str):
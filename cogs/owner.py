@@ -1,6 +1,30 @@
 import discord
 from discord.ext import commands
 
+import io
+import copy
+import time
+import asyncio
+import logging
+import cProfile
+from cogs.cluestore import import_dump, get_clue_store
+from cogs.profiler import SamplingProfiler, profile_report
+
+
+def cogs_of(bot, extension):
+    return {name: cog for name, cog in bot.cogs.items() if type(cog).__module__ == extension}
+
+
+async def warm_up(cogs):
+    """Does the warm up startup does for cogs loaded once the bot is already running."""
+    for name, cog in cogs.items():
+        if hasattr(cog, 'warm_up'):
+            try:
+                await cog.warm_up()
+            except Exception:
+                logging.exception(f"Warming up {name} failed")
+
+
 class OwnerCog(commands.Cog):
 
     def __init__(self, bot):
@@ -30,6 +54,7 @@ class OwnerCog(commands.Cog):
         except Exception as e:
             await ctx.send(f'**`ERROR:`** {type(e).__name__} - {e}')
         else:
+            await warm_up(cogs_of(self.bot, cog))
             await ctx.send('**`SUCCESS`**')
 
 
@@ -49,15 +74,98 @@ class OwnerCog(commands.Cog):
     @commands.command(name='reload', hidden=True)
     @commands.is_owner()
     async def reload_cog(self, ctx, *, cog: str):
-        """Command which Reloads a Module."""
+        """
+        Command which Reloads a Module. Cogs with export_state hand their
+        live state to the new ones' adopt_state, the others warm up again.
+        """
+
+        start = time.perf_counter()
+        states = {}
+        if cog in self.bot.extensions:
+            states = {name: old.export_state() for name, old in cogs_of(self.bot, cog).items()
+                      if hasattr(old, 'export_state')}
+        try:
+            self.bot.reload_extension(cog)
+        except Exception as e:
+            error = e
+        else:
+            error = None
+        # a failed reload puts the old module back, its cogs take the state over just the same
+        kept = []
+        cold = {}
+        for name, new in cogs_of(self.bot, cog).items():
+            if name in states:
+                new.adopt_state(states.pop(name))
+                kept.append(name)
+            else:
+                cold[name] = new
+        await warm_up(cold)
+        elapsed = time.perf_counter() - start
+        if states:
+            logging.warning(f"Nothing took over the state of {', '.join(states)} after reloading {cog}")
+            for state in states.values():
+                if 'database' in state:
+                    state['database'].close()
+        if error is not None:
+            return await ctx.send(f'**`ERROR:`** {type(error).__name__} - {error}')
+        await ctx.send(f'**`SUCCESS`** in {elapsed * 1000:.0f}ms' +
+                       (f", kept the state of {', '.join(kept)}" if kept else ''))
+
+
+    @commands.command(name='import_clues', hidden=True)
+    @commands.is_owner()
+    async def import_clues(self, ctx, *, path: str):
+        """Loads a JSON dump of clues into the local clue store."""
 
+        start = time.perf_counter()
         try:
-            self.bot.unload_extension(cog)
-            self.bot.load_extension(cog)
+            amount = await self.bot.loop.run_in_executor(None, import_dump, path)
         except Exception as e:
             await ctx.send(f'**`ERROR:`** {type(e).__name__} - {e}')
         else:
-            await ctx.send('**`SUCCESS`**')
+            get_clue_store().id_range = None
+            get_clue_store().board_range = None
+            elapsed = time.perf_counter() - start
+            await ctx.send(f'Imported {amount} clues in {elapsed:.1f}s ({amount / elapsed:.0f} clues/s).')
+
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def profile(self, ctx, seconds: float = 10.0):
+        """Samples what the bot spends its time on for up to a minute."""
+        seconds = min(max(seconds, 1.0), 60.0)
+        await ctx.send(f'Profiling for {seconds:.0f}s.')
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+        await ctx.send(file=discord.File(io.BytesIO(profiler.report().encode()), 'profile.txt'))
+
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def profile_command(self, ctx, *, command: str):
+        """
+        Runs a command under cProfile. Whatever else the bot does until it
+        finishes is profiled too, and everything runs slower meanwhile.
+        """
+        message = copy.copy(ctx.message)
+        message.content = ctx.prefix + command
+        command_ctx = await self.bot.get_context(message)
+        if command_ctx.command is None:
+            return await ctx.send(f"There's no command called {command.split()[0]}.")
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            await self.bot.invoke(command_ctx)
+        finally:
+            profile.disable()
+        elapsed = time.perf_counter() - start
+        await ctx.send(f'`{command}` took {elapsed:.2f}s.',
+                       file=discord.File(io.BytesIO(profile_report(profile).encode()), 'profile.txt'))
 
 def setup(bot):
     bot.add_cog(OwnerCog(bot))
@@ -0,0 +1,86 @@
+import io
+import os
+import sys
+import pstats
+import selectors
+import threading
+import collections
+
+SELECTORS_FILE = selectors.__file__
+
+
+def describe_code(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """
+    Looks at the stack of one thread every interval seconds from a thread
+    of its own. Counts how often each function was running (own) and how
+    often it was anywhere on the stack (cumulative). The profiled thread
+    only pays for giving up the GIL, so it's fine to run on live traffic.
+    Samples where the event loop was waiting for events count as idle.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.own = collections.Counter()
+        self.cumulative = collections.Counter()
+        self.samples = 0
+        self.idle = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='profiler', daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            self.sample(frame)
+
+
+    def sample(self, frame):
+        self.samples += 1
+        if frame.f_code.co_filename == SELECTORS_FILE:
+            self.idle += 1
+            return
+        self.own[frame.f_code] += 1
+        seen = set()
+        while frame is not None:
+            if frame.f_code not in seen:
+                seen.add(frame.f_code)
+                self.cumulative[frame.f_code] += 1
+            frame = frame.f_back
+
+
+    def report(self, limit=40):
+        busy = self.samples - self.idle
+        result = (f'{self.samples} samples every {self.interval * 1000:.0f}ms, '
+                  f'{busy} busy and {self.idle} waiting for events.\n')
+        for title, counter in (('By cumulative time', self.cumulative), ('By own time', self.own)):
+            result += f'\n{title}:\n{"samples":>8} {"busy":>6}  function\n'
+            for code, amount in counter.most_common(limit):
+                result += f'{amount:>8} {amount / max(1, busy):>6.1%}  {describe_code(code)}\n'
+        return result
+
+
+def profile_report(profile, limit=40):
+    """The functions a cProfile.Profile spent the most cumulative and own time in."""
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+    stats.sort_stats('tottime').print_stats(limit)
+    return stream.getvalue()
@@ -1,20 +1,112 @@
 import discord
+import re
+import bisect
 import asyncio
-import sqlite3
 from discord.ext import commands
+from cogs.utilities import connect_database, EXECUTOR_BUSY_TIMEOUT
+from cogs.waiters import get_waiters
+from cogs.members import get_member_cache
+
+
+class UnknownRole(commands.RoleNotFound):
+    def __init__(self, argument, suggestions):
+        super().__init__(argument)
+        self.suggestions = suggestions
+
+
+def not_a_role(error):
+    suggestions = getattr(error, 'suggestions', None)
+    if suggestions:
+        return f"That's not a role, did you mean {', '.join(suggestions)}?"
+    return "That's not a role."
+
+
+class RoleIndex:
+    """
+    The lowercased role names of every guild that has looked one up, kept
+    up to date from role events so a lookup doesn't go through every role.
+    Several roles can share a name. Whether a role is below the bot's top
+    role is checked when it's looked up, so moving roles changes nothing.
+    """
+
+    def __init__(self):
+        # guild id -> ({lowercased name: [role ids]}, sorted [(lowercased name, role id)])
+        self.guilds = {}
+
+
+    def get_guild(self, guild):
+        index = self.guilds.get(guild.id)
+        if index is None:
+            index = self.guilds[guild.id] = ({}, [])
+            for role in guild.roles[1:]:
+                self.add(role)
+        return index
+
+
+    def add(self, role):
+        index = self.guilds.get(role.guild.id)
+        if index is None or role.is_default():
+            return
+        names, entries = index
+        name = role.name.lower()
+        names.setdefault(name, []).append(role.id)
+        bisect.insort(entries, (name, role.id))
+
+
+    def remove(self, role):
+        index = self.guilds.get(role.guild.id)
+        if index is None or role.is_default():
+            return
+        names, entries = index
+        name = role.name.lower()
+        role_ids = names.get(name, [])
+        if role.id in role_ids:
+            role_ids.remove(role.id)
+            if not role_ids:
+                del names[name]
+            del entries[bisect.bisect_left(entries, (name, role.id))]
+
+
+    def find(self, guild, argument, top_role):
+        """The role named exactly argument, else the highest below top_role with its name in any case."""
+        names, _ = self.get_guild(guild)
+        roles = [guild.get_role(role_id) for role_id in names.get(argument.lower(), ())]
+        roles = [role for role in roles if role is not None]
+        for role in roles:
+            if role.name == argument:
+                return role
+        roles = [role for role in roles if role < top_role]
+        return max(roles) if roles else None
+
+
+    def suggest(self, guild, prefix, top_role, limit=5):
+        """Names of the roles below top_role that start with prefix, in any case."""
+        _, entries = self.get_guild(guild)
+        prefix = prefix.lower()
+        result = []
+        for name, role_id in entries[bisect.bisect_left(entries, (prefix,)):]:
+            if not name.startswith(prefix) or len(result) == limit:
+                break
+            role = guild.get_role(role_id)
+            if role is not None and role < top_role and role.name not in result:
+                result.append(role.name)
+        return result
+
+
+    def forget(self, guild):
+        self.guilds.pop(guild.id, None)
 
 
 class RoleLowerConverter(commands.RoleConverter):
     async def convert(self, ctx, argument):
-        try:
-            result = await super().convert(ctx, argument)
-        except commands.BadArgument:
-            roles = [role for role in ctx.guild.roles if role < ctx.me.top_role]
-            roles = {str(role).lower():role for role in roles}
-            result = roles.get(argument.lower())
-
+        if ctx.guild is None:
+            raise commands.NoPrivateMessage()
+        if self._get_id_match(argument) or re.match(r'<@&([0-9]+)>$', argument):
+            return await super().convert(ctx, argument)
+        index = ctx.cog.role_index
+        result = index.find(ctx.guild, argument, ctx.me.top_role)
         if result is None:
-            raise commands.BadArgument('Role "{}" not found.'.format(argument))
+            raise UnknownRole(argument, index.suggest(ctx.guild, argument, ctx.me.top_role))
         return result
 
 
@@ -23,18 +115,83 @@ class RoleCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.reaction_roles = {}
-        self.database = sqlite3.connect('database.db')
+        self.database = connect_database('database.db')
         self.db_cursor = self.database.cursor()
         self.db_cursor.execute("""CREATE TABLE IF NOT EXISTS autoroles
                                   (role integer, guild integer)""")
         self.db_cursor.execute("""CREATE TABLE IF NOT EXISTS reactionroles
                                   (role integer, message integer, channel integer)""")
         self.database.commit()
-        reaction_roles = self.db_cursor.execute(f'SELECT role, message, channel FROM reactionroles')
-        for (role, message, channel) in reaction_roles:
-            if message not in self.reaction_roles:
-                self.reaction_roles[message] = {}
-            self.reaction_roles[message][channel] = role
+        self.reaction_roles_loaded = asyncio.Event()
+        self.waiters = get_waiters(bot)
+        self.role_index = RoleIndex()
+        self.members = get_member_cache(bot)
+        self.exported = False
+
+
+    def cog_unload(self):
+        # an exported database is the new RoleCog's now
+        if not self.exported:
+            self.waiters.cancel(self)
+            self.database.close()
+
+
+    def export_state(self):
+        self.exported = True
+        return {'reaction_roles': self.reaction_roles, 'role_index': self.role_index,
+                'database': self.database, 'loaded': self.reaction_roles_loaded}
+
+
+    def adopt_state(self, state):
+        self.database.close()
+        self.database = state['database']
+        self.db_cursor = self.database.cursor()
+        self.reaction_roles = state['reaction_roles']
+        self.role_index = state['role_index']
+        self.reaction_roles_loaded = state['loaded']
+
+
+    @staticmethod
+    def read_reaction_roles():
+        database = connect_database('database.db', EXECUTOR_BUSY_TIMEOUT)
+        try:
+            return database.execute('SELECT role, message, channel FROM reactionroles').fetchall()
+        finally:
+            database.close()
+
+
+    async def warm_up(self):
+        # reactions wait for this, so they go on without reaction roles rather than forever
+        try:
+            reaction_roles = await self.bot.loop.run_in_executor(None, self.read_reaction_roles)
+            for (role, message, channel) in reaction_roles:
+                if message not in self.reaction_roles:
+                    self.reaction_roles[message] = {}
+                self.reaction_roles[message].setdefault(channel, role)
+        finally:
+            self.reaction_roles_loaded.set()
+
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role):
+        self.role_index.add(role)
+
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self.role_index.remove(role)
+
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        if before.name != after.name:
+            self.role_index.remove(before)
+            self.role_index.add(after)
+
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.role_index.forget(guild)
 
 
     @commands.Cog.listener()
@@ -97,7 +254,8 @@ class RoleCog(commands.Cog):
         def is_valid_reaction(reaction, user):
             return user == ctx.author and reaction.message.id == message.id and str(reaction.emoji) in ('✅', '❎')
         try:
-            reaction, _ = await self.bot.wait_for('reaction_add', timeout=15.0, check=is_valid_reaction)
+            reaction, _ = await self.waiters.wait_for(self, 'reaction_add', timeout=15.0,
+                                                      check=is_valid_reaction, channel_id=ctx.channel.id)
             change_nickname = str(reaction.emoji) == '✅'
         except asyncio.TimeoutError:
             change_nickname = False
@@ -146,7 +304,8 @@ class RoleCog(commands.Cog):
         def is_valid_reaction(reaction, user):
             return user == ctx.author and reaction.message.id == message.id and str(reaction.emoji) in ('✅', '❎')
         try:
-            reaction, _ = await self.bot.wait_for('reaction_add', timeout=15.0, check=is_valid_reaction)
+            reaction, _ = await self.waiters.wait_for(self, 'reaction_add', timeout=15.0,
+                                                      check=is_valid_reaction, channel_id=ctx.channel.id)
             change_nickname = str(reaction.emoji) == '✅'
         except asyncio.TimeoutError:
             change_nickname = False
@@ -172,7 +331,7 @@ class RoleCog(commands.Cog):
     @autorole.error
     async def autorole_error(self, ctx, error):
         if isinstance(error, commands.BadArgument):
-            return await ctx.send("That's not a role.")
+            return await ctx.send(not_a_role(error))
         elif isinstance(error, commands.MissingRequiredArgument):
             return await ctx.send(f"Usage: {ctx.invoked_with} <role>")
         raise error
@@ -180,7 +339,7 @@ class RoleCog(commands.Cog):
     @add_role.error
     async def add_role_error(self, ctx, error):
         if isinstance(error, commands.BadArgument):
-            return await ctx.send("That's not a role.")
+            return await ctx.send(not_a_role(error))
         elif isinstance(error, commands.MissingRequiredArgument):
             return await ctx.send(f"Usage: {ctx.invoked_with} <role>")
         raise error
@@ -188,24 +347,20 @@ class RoleCog(commands.Cog):
     @remove_role.error
     async def remove_role_error(self, ctx, error):
         if isinstance(error, commands.BadArgument):
-            return await ctx.send("That's not a role.")
+            return await ctx.send(not_a_role(error))
         elif isinstance(error, commands.MissingRequiredArgument):
             return await ctx.send(f"Usage: {ctx.invoked_with} <role>")
         raise error
 
     @commands.command(aliases=["lr", "roles"])
     async def list_roles(self, ctx):
-        roles = ctx.guild.roles
-        roles = roles[1:roles.index(ctx.me.top_role)]
-        roles = [str(role) for role in roles]
+        roles = [str(role) for role in ctx.guild.roles[1:] if role < ctx.me.top_role]
         await ctx.send(f"The available roles are: {roles}")
 
 
     @commands.command(aliases=["lt", "tags"])
     async def list_tags(self, ctx):
-        roles = ctx.guild.roles
-        roles = roles[1:roles.index(ctx.me.top_role)]
-        roles = [role for role in ctx.author.roles if (role in roles) and (not role.managed)]
+        roles = [role for role in ctx.author.roles[1:] if role < ctx.me.top_role and not role.managed]
         tags = " ("
         for role in roles:
             tags += f"{role}, "
@@ -246,7 +401,7 @@ class RoleCog(commands.Cog):
     @reaction_role.error
     async def reaction_role_error(self, ctx, error):
         if isinstance(error, commands.BadArgument):
-            return await ctx.send("That's not a role.")
+            return await ctx.send(not_a_role(error))
         elif isinstance(error, commands.MissingRequiredArgument):
             return await ctx.send(f"Usage: {ctx.invoked_with} <role>")
         raise error
@@ -254,6 +409,7 @@ class RoleCog(commands.Cog):
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, raw_reaction):
+        await self.reaction_roles_loaded.wait()
         message_id = raw_reaction.message_id
         if message_id not in self.reaction_roles:
             return
@@ -278,7 +434,10 @@ class RoleCog(commands.Cog):
         if guild is None:
             return
 
-        member = guild.get_member(user_id)
+        if raw_reaction.member is not None:
+            member = self.members.remember(raw_reaction.member)
+        else:
+            member = await self.members.fetch(guild, user_id)
         if member is None:
             return
 
@@ -0,0 +1,48 @@
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Times each phase of booting the bot so they can be reported once it's ready."""
+
+    def __init__(self, started=None):
+        self.started = started or time.perf_counter()
+        self.phases = []
+
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+
+    async def timed(self, name, coroutine):
+        with self.phase(name):
+            try:
+                await coroutine
+            except Exception:
+                logging.exception(f"Startup phase {name} failed")
+
+
+    def since_start(self):
+        return time.perf_counter() - self.started
+
+
+    def report(self):
+        lines = [f'{name}: {elapsed * 1000:.0f}ms' for name, elapsed in self.phases]
+        return f'Started in {self.since_start():.2f}s (' + ', '.join(lines) + ')'
+
+
+async def warm_up_cogs(bot, timer):
+    """
+    Runs every cog's warm_up coroutine at the same time, for work that
+    doesn't have to be done before logging in.
+    """
+    warm_ups = [timer.timed(f'{name} warm up', cog.warm_up())
+                for name, cog in bot.cogs.items() if hasattr(cog, 'warm_up')]
+    await asyncio.gather(*warm_ups)
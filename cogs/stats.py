@@ -0,0 +1,206 @@
+import discord
+from discord.ext import commands, tasks
+
+import time
+import asyncio
+import logging
+import collections
+from cogs.utilities import connect_database, EXECUTOR_BUSY_TIMEOUT
+from cogs.logs import context_fields
+from cogs.metrics import metrics
+from cogs.members import get_member_cache
+
+EVENT_KINDS = ('buzz', 'answer', 'daily double', 'final')
+# per-user totals, kept for every guild and across all of them (guild 0)
+TOTALS = ('buzzes', 'answers', 'correct', 'points')
+# how often pending events are written, by StatsCog or else by the next event recorded
+FLUSH_INTERVAL = 10.0
+
+
+def create_tables(database):
+    database.execute("""CREATE TABLE IF NOT EXISTS events
+                        (time real, guild_id integer, channel_id integer, user_id integer,
+                         kind integer, clue_id integer, correct integer, points integer)""")
+    database.execute("""CREATE TABLE IF NOT EXISTS totals
+                        (guild_id integer, user_id integer, buzzes integer, answers integer,
+                         correct integer, points integer, PRIMARY KEY (guild_id, user_id))""")
+    database.execute("""CREATE INDEX IF NOT EXISTS totals_by_points
+                        ON totals (guild_id, points, user_id)""")
+    database.commit()
+
+
+def totals_of(events):
+    """How much each (guild_id, user_id), and each (0, user_id), totals change by with the events."""
+    changes = collections.defaultdict(lambda: [0, 0, 0, 0])
+    for _, guild_id, _, user_id, kind, _, correct, points in events:
+        for key in ((guild_id, user_id), (0, user_id)):
+            change = changes[key]
+            if EVENT_KINDS[kind] == 'buzz':
+                change[0] += 1
+            else:
+                change[1] += 1
+                change[2] += bool(correct)
+            change[3] += points
+    return changes
+
+
+def write_events(path, events):
+    """Appends the events and adds them to the totals in one transaction, for an executor."""
+    database = connect_database(path, EXECUTOR_BUSY_TIMEOUT)
+    try:
+        with database:
+            database.executemany('INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)', events)
+            database.executemany("""INSERT INTO totals VALUES (?, ?, ?, ?, ?, ?)
+                                    ON CONFLICT (guild_id, user_id) DO UPDATE SET
+                                    buzzes = buzzes + excluded.buzzes,
+                                    answers = answers + excluded.answers,
+                                    correct = correct + excluded.correct,
+                                    points = points + excluded.points""",
+                                 [key + tuple(change) for key, change in totals_of(events).items()])
+    finally:
+        database.close()
+
+
+class PlayerStats:
+    """
+    Buzzes, answers, daily doubles and final results as compact events.
+    Recording one only queues it, flush writes the queue and the totals it
+    changes in a batch from an executor. Leaderboards and ranks are read
+    from the totals index, so neither scans every player and both see the
+    points other processes wrote.
+    """
+
+    def __init__(self, path='stats.db'):
+        self.path = path
+        self.database = connect_database(path)
+        create_tables(self.database)
+        self.pending = []
+        self.lock = asyncio.Lock()
+        self.flushed_at = time.monotonic()
+
+
+    def record(self, kind, guild_id, channel_id, user_id, clue_id=None, correct=None, points=0):
+        self.pending.append((time.time(), guild_id or 0, channel_id, user_id, EVENT_KINDS.index(kind),
+                             clue_id, correct, points))
+        metrics.increment('player_events_total', kind=kind)
+        # the game records events whether or not StatsCog is loaded to flush them
+        if time.monotonic() - self.flushed_at >= FLUSH_INTERVAL and not self.lock.locked():
+            self.flushed_at = time.monotonic()
+            asyncio.ensure_future(self.flush(asyncio.get_event_loop()))
+
+
+    async def flush(self, loop):
+        async with self.lock:
+            self.flushed_at = time.monotonic()
+            events, self.pending = self.pending, []
+            if not events:
+                return
+            start = time.perf_counter()
+            try:
+                await loop.run_in_executor(None, write_events, self.path, events)
+            except Exception:
+                logging.exception(f"Couldn't write {len(events)} player events")
+                self.pending[:0] = events
+                return
+            metrics.observe('player_events_flush_seconds', time.perf_counter() - start)
+
+
+    def leaderboard(self, guild_id=0, limit=10):
+        """(user_id, points, answers, correct) of the best players, best first."""
+        return self.database.execute("""SELECT user_id, points, answers, correct FROM totals
+                                        WHERE guild_id = ? ORDER BY points DESC, user_id DESC LIMIT ?""",
+                                     (guild_id, limit)).fetchall()
+
+
+    def totals(self, guild_id, user_id):
+        """The totals of a user including events that haven't been written, None if they have none."""
+        row = self.database.execute('SELECT buzzes, answers, correct, points FROM totals '
+                                    'WHERE guild_id = ? AND user_id = ?', (guild_id, user_id)).fetchone()
+        pending = totals_of([event for event in self.pending if event[3] == user_id]).get((guild_id, user_id))
+        if row is None and pending is None:
+            return None
+        return dict(zip(TOTALS, [a + b for a, b in zip(row or (0, 0, 0, 0), pending or (0, 0, 0, 0))]))
+
+
+    def rank(self, guild_id, user_id):
+        """1 for the player with the most points in the guild, None if they have no totals there."""
+        totals = self.totals(guild_id, user_id)
+        if totals is None:
+            return None
+        ahead, = self.database.execute('SELECT count(*) FROM totals WHERE guild_id = ? AND points > ?',
+                                       (guild_id, totals['points'])).fetchone()
+        return ahead + 1
+
+
+def get_player_stats(bot):
+    stats = getattr(bot, 'player_stats', None)
+    if stats is None:
+        stats = bot.player_stats = PlayerStats()
+    return stats
+
+
+class StatsCog(commands.Cog):
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.player_stats = get_player_stats(bot)
+        self.members = get_member_cache(bot)
+        self.flush_events.start()
+
+
+    def cog_unload(self):
+        self.flush_events.cancel()
+        # in the executor, a locked database mustn't freeze the bot, and whatever
+        # isn't written yet stays queued for the next StatsCog or record
+        self.bot.loop.create_task(self.player_stats.flush(self.bot.loop))
+
+
+    async def cog_before_invoke(self, ctx):
+        logging.info(ctx.message.content, extra=context_fields(ctx))
+
+
+    @tasks.loop(seconds=FLUSH_INTERVAL)
+    async def flush_events(self):
+        await self.player_stats.flush(self.bot.loop)
+
+
+    @commands.command()
+    async def stats(self, ctx, member:discord.Member=None):
+        """Your answers and winnings here and everywhere, or someone else's"""
+        member = member or ctx.author
+        guild_id = ctx.guild.id if ctx.guild else 0
+        everywhere = self.player_stats.totals(0, member.id)
+        if everywhere is None:
+            return await ctx.send(f"{member.display_name} hasn't played yet.")
+        result = f"**{member.display_name}**\n"
+        here = self.player_stats.totals(guild_id, member.id) if guild_id else None
+        for name, totals in (('Here', here), ('Everywhere', everywhere)):
+            if totals is None:
+                continue
+            accuracy = totals['correct'] / totals['answers'] if totals['answers'] else 0.0
+            result += (f"{name}: ${totals['points']}, {totals['correct']} of {totals['answers']} "
+                       f"answers right ({accuracy:.0%}), {totals['buzzes']} buzzes")
+            rank = name == 'Here' and self.player_stats.rank(guild_id, member.id)
+            if rank:
+                result += f", rank {rank}"
+            result += ".\n"
+        await ctx.send(result)
+
+
+    @commands.command()
+    async def leaderboard(self, ctx, scope='here'):
+        """The players with the most winnings, `leaderboard global` for everywhere"""
+        guild_id = 0 if scope == 'global' or ctx.guild is None else ctx.guild.id
+        rows = self.player_stats.leaderboard(guild_id)
+        if not rows:
+            return await ctx.send("Nobody has played yet.")
+        result = ''
+        for i, (user_id, points, answers, correct) in enumerate(rows):
+            user = (ctx.guild and self.members.get(ctx.guild, user_id)) or self.bot.get_user(user_id)
+            name = user.display_name if user else f'Player {user_id}'
+            result += f"{i+1}. {name} with ${points}, {correct} of {answers} right.\n"
+        await ctx.send(result)
+
+
+def setup(bot):
+    bot.add_cog(StatsCog(bot))
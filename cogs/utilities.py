@@ -1,23 +1,34 @@
-import aiohttp
+import os
 import re
-import logging
+import sqlite3
 
 heard_here_re = re.compile(r'\bheard here[\:]*$', re.IGNORECASE)
 audio_re = re.compile(r'\[audio', re.IGNORECASE)
 seen_here_re = re.compile(r'\bseen here\b', re.IGNORECASE)
-# jservice = "http://localhost:3000/"
-jservice = "http://jservice.io/"
+number_re = re.compile(r'\d+')
+# JSERVICE_URL=http://localhost:3000/ uses jservice_server.py instead
+jservice = os.environ.get('JSERVICE_URL', "http://jservice.io/")
 
 
-async def jservice_get_json(session, path, params={}):
-    logging.info(path)
-    logging.info(params)
-    async with session.get(jservice + path, params=params) as r:
-        if r.status == 200:
-            js = await r.json()
-            return js
-        else:
-            return None
+async def jservice_get_json(client, path, params={}):
+    return await client.get_json(path, params)
+
+
+# connections used on the event loop give up on a lock held by another process
+# quickly, so it can't hold up the gateway heartbeat, those in an executor wait
+LOOP_BUSY_TIMEOUT = 0.5
+EXECUTOR_BUSY_TIMEOUT = 30.0
+
+
+def connect_database(path='database.db', timeout=LOOP_BUSY_TIMEOUT):
+    """
+    Every shard process opens the same database, so use WAL (readers don't
+    block the writer) and wait on locks for a while instead of failing right
+    away. Pass EXECUTOR_BUSY_TIMEOUT for connections used off the event loop.
+    """
+    database = sqlite3.connect(path, timeout=timeout)
+    database.execute('PRAGMA journal_mode=WAL')
+    return database
 
 
 def is_audio_clue(clue):
@@ -31,7 +42,8 @@ def is_video_clue(clue):
 
 
 def is_valid_clue(clue, allow_audio=False, allow_video=False):
+    # possible_answers is empty for answers the clue store found nothing left of
     return (not clue['invalid_count'] and clue['question'] and clue['answer'] and 
-            clue['question'] != '=' and
+            clue.get('possible_answers') != [] and clue['question'] != '=' and
             (allow_audio or not is_audio_clue(clue) and
             (allow_video or not is_video_clue(clue))))
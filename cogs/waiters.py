@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import dataclasses
+
+# a wait still registered this long after its deadline has leaked
+LEAK_GRACE = 5.0
+
+
+def describe_caller(depth=2):
+    frame = sys._getframe(depth)
+    return f'{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})'
+
+
+@dataclasses.dataclass(eq=False)
+class Wait:
+    owner: str
+    event: str
+    origin: str
+    timeout: float
+    task: asyncio.Task
+    channel_id: int = None
+    started: float = dataclasses.field(default_factory=time.monotonic)
+
+
+    def age(self):
+        return time.monotonic() - self.started
+
+
+    def is_leaked(self):
+        return self.age() > self.timeout + LEAK_GRACE
+
+
+@dataclasses.dataclass(eq=False)
+class Background:
+    owner: str
+    origin: str
+    task: asyncio.Task
+    channel_id: int = None
+    started: float = dataclasses.field(default_factory=time.monotonic)
+
+
+    def age(self):
+        return time.monotonic() - self.started
+
+
+class Waiters:
+    """
+    Every interactive wait and background task the cogs start, so they can
+    be cancelled when a game is stopped or a cog unloads and so the ones
+    that outlive their welcome show up in a report. Waits need a deadline.
+    Cancelling a wait cancels the command waiting on it.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.waits = set()
+        self.tasks = set()
+
+
+    async def wait_for(self, owner, event, *, check, timeout, channel_id=None):
+        if timeout is None or timeout <= 0:
+            raise ValueError('Waits need a deadline')
+        wait = Wait(type(owner).__name__, event, describe_caller(), timeout,
+                    asyncio.current_task(), channel_id)
+        self.waits.add(wait)
+        try:
+            return await self.bot.wait_for(event, check=check, timeout=timeout)
+        finally:
+            self.waits.discard(wait)
+
+
+    def spawn(self, owner, coroutine, channel_id=None):
+        task = asyncio.ensure_future(coroutine)
+        background = Background(type(owner).__name__, describe_caller(), task, channel_id)
+        self.tasks.add(background)
+        task.add_done_callback(lambda _: self.tasks.discard(background))
+        return task
+
+
+    def cancel(self, owner=None, channel_id=None):
+        """Cancels the waits and tasks of a cog, a channel or both. Returns how many."""
+        owner = owner and type(owner).__name__
+        cancelled = 0
+        current = asyncio.current_task()
+        for item in list(self.waits) + list(self.tasks):
+            if ((owner is None or item.owner == owner) and
+                (channel_id is None or item.channel_id == channel_id) and
+                item.task is not current and not item.task.done()):
+                item.task.cancel()
+                cancelled += 1
+        return cancelled
+
+
+    def leaks(self):
+        return [wait for wait in self.waits if wait.is_leaked()]
+
+
+    def report(self, limit=20):
+        leaks = self.leaks()
+        result = (f'{len(self.waits)} waits, {len(leaks)} past their deadline, '
+                  f'{len(self.tasks)} background tasks.\n')
+        if leaks:
+            result += 'Leaked waits:\n'
+            for wait in sorted(leaks, key=Wait.age, reverse=True)[:limit]:
+                result += (f'  {wait.owner} {wait.event} from {wait.origin}, '
+                           f'{wait.age():.0f}s old with a {wait.timeout:.0f}s deadline\n')
+        waits = sorted(self.waits, key=Wait.age, reverse=True)[:limit]
+        if waits:
+            result += 'Oldest waits:\n'
+            for wait in waits:
+                result += (f'  {wait.owner} {wait.event} from {wait.origin} '
+                           f'in {wait.channel_id}, {wait.age():.0f}s old\n')
+        tasks = group_by_origin(self.tasks)
+        if tasks:
+            result += 'Background tasks:\n'
+            for (owner, origin), (amount, oldest) in tasks[:limit]:
+                result += f'  {amount} from {owner} {origin}, oldest {oldest:.0f}s\n'
+        return result
+
+
+    def log_leaks(self):
+        for wait in self.leaks():
+            logging.warning(f"Wait for {wait.event} from {wait.origin} is {wait.age():.0f}s old, "
+                            f"its deadline was {wait.timeout:.0f}s")
+
+
+def group_by_origin(tasks):
+    """(owner, origin), (amount, oldest age) of the tasks, oldest first."""
+    groups = {}
+    for background in tasks:
+        key = (background.owner, background.origin)
+        amount, oldest = groups.get(key, (0, 0.0))
+        groups[key] = (amount + 1, max(oldest, background.age()))
+    return sorted(groups.items(), key=lambda item: item[1][1], reverse=True)
+
+
+def get_waiters(bot):
+    waiters = getattr(bot, 'waiters', None)
+    if waiters is None:
+        waiters = bot.waiters = Waiters(bot)
+    return waiters
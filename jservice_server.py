@@ -0,0 +1,158 @@
+"""
+A stand-in for the parts of jservice the bot uses, serving a local JSON dump
+(see cogs.cluestore.load_dump). Point the bot at it with
+JSERVICE_URL=http://localhost:3000/
+
+    python3 jservice_server.py clues.json --latency 0.05 --error-rate 0.01
+"""
+import random
+import asyncio
+import argparse
+import logging
+from aiohttp import web
+
+from cogs.cluestore import load_dump, CLUE_COLUMNS
+
+
+class Corpus:
+
+    def __init__(self, dump):
+        self.clues = {}
+        self.categories = {}
+        self.category_clues = {}
+        for clue in dump:
+            category = clue.get('category') or {}
+            category_id = clue.get('category_id') or category.get('id')
+            self.clues[clue['id']] = {key: clue.get(key) for key in CLUE_COLUMNS}
+            self.clues[clue['id']]['category_id'] = category_id
+            if category_id not in self.categories:
+                self.categories[category_id] = {'id': category_id,
+                                                'title': category.get('title', ''),
+                                                'clues_count': 0}
+                self.category_clues[category_id] = []
+            self.category_clues[category_id].append(clue['id'])
+        for category_id, clue_ids in self.category_clues.items():
+            clue_ids.sort()
+            self.categories[category_id]['clues_count'] = len(clue_ids)
+        self.category_order = sorted(self.categories)
+        self.clue_order = sorted(self.clues)
+
+
+    def clue_with_category(self, clue_id):
+        clue = dict(self.clues[clue_id])
+        clue['category'] = self.categories[clue['category_id']]
+        return clue
+
+
+    def lookup(self, path, params):
+        """
+        What jservice would answer to path with those query params, or None
+        for a 404. Raises ValueError for params that aren't numbers.
+        """
+        parts = path.strip('/').split('/')
+        if len(parts) == 2 and parts[0] in ('clues', 'categories') and parts[1].endswith('.json'):
+            item_id = int(parts[1][:-len('.json')])
+            if parts[0] == 'clues':
+                return self.clues.get(item_id)
+            return self.categories.get(item_id)
+        if path == 'api/category':
+            category_id = int(params.get('id', 0))
+            if category_id not in self.categories:
+                return None
+            category = dict(self.categories[category_id])
+            category['clues'] = [self.clues[clue_id] for clue_id in self.category_clues[category_id]]
+            return category
+        if path == 'api/categories':
+            count = min(int(params.get('count', 1)), 100)
+            offset = int(params.get('offset', 0))
+            return [self.categories[category_id]
+                    for category_id in self.category_order[offset:offset+count]]
+        if path == 'api/clues':
+            return self.find_clues(params)
+        return None
+
+
+    def find_clues(self, params):
+        value = int(params['value']) if 'value' in params else None
+        offset = int(params.get('offset', 0))
+        min_date = params.get('min_date')
+        max_date = params.get('max_date')
+        if 'category' in params:
+            clue_ids = self.category_clues.get(int(params['category']), [])
+        else:
+            clue_ids = self.clue_order
+        result = []
+        for clue_id in clue_ids:
+            clue = self.clues[clue_id]
+            if ((value is None or clue['value'] == value) and
+                (min_date is None or (clue['airdate'] or '') >= min_date) and
+                (max_date is None or (clue['airdate'] or '') <= max_date)):
+                if offset:
+                    offset -= 1
+                    continue
+                result.append(self.clue_with_category(clue_id))
+                if len(result) == 100:
+                    break
+        return result
+
+
+class Server:
+
+    def __init__(self, corpus, latency=0.0, jitter=0.0, error_rate=0.0, stall_rate=0.0,
+                 stall=30.0):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+
+
+    @web.middleware
+    async def inject_faults(self, request, handler):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if self.stall_rate and random.random() < self.stall_rate:
+            delay += self.stall
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            raise web.HTTPInternalServerError()
+        return await handler(request)
+
+
+    def make_app(self):
+        app = web.Application(middlewares=[self.inject_faults])
+        app.add_routes([web.get('/clues/{id:\\d+}.json', self.handle),
+                        web.get('/categories/{id:\\d+}.json', self.handle),
+                        web.get('/api/category', self.handle),
+                        web.get('/api/categories', self.handle),
+                        web.get('/api/clues', self.handle)])
+        return app
+
+
+    async def handle(self, request):
+        try:
+            result = self.corpus.lookup(request.path.lstrip('/'), request.query)
+        except ValueError:
+            raise web.HTTPBadRequest(text='parameters need to be numbers')
+        if result is None:
+            raise web.HTTPNotFound()
+        return web.json_response(result)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a jservice dump locally.')
+    parser.add_argument('dump', help='JSON list of clues with nested categories')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 500 responses')
+    parser.add_argument('--stall-rate', type=float, default=0.0,
+                        help='fraction of responses delayed by --stall seconds')
+    parser.add_argument('--stall', type=float, default=30.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    server = Server(Corpus(load_dump(args.dump)), args.latency, args.jitter,
+                    args.error_rate, args.stall_rate, args.stall)
+    web.run_app(server.make_app(), host=args.host, port=args.port)
@@ -0,0 +1,691 @@
+"""
+Headless load test. Drives GameCog, BrowserCog, RoleCog and AutoDeleteCog
+with fake Discord objects, simulated players and an in-process jservice, so
+it needs neither a token nor the network.
+
+    python3 loadtest.py --channels 1000 --mode clue --rounds 5
+    python3 loadtest.py --channels 200 --mode jeopardy --members 5000 --autodelete 500
+    python3 loadtest.py --check-breaker
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import itertools
+import resource
+import tempfile
+import tracemalloc
+import collections
+from datetime import datetime
+
+import discord
+from discord.ext import commands
+
+from benchmarks import synthetic_corpus, CLUE_AMOUNT
+from jservice_server import Corpus
+from cogs.client import JServiceClient
+from cogs.loopmonitor import LoopMonitor
+from cogs.metrics import metrics
+
+question_re = re.compile(r'`(\d+):(\d+)`')
+ids = itertools.count(10**6)
+
+
+class FakeUser:
+
+    def __init__(self, harness, name, bot=False):
+        self.harness = harness
+        self.id = next(ids)
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.dm_channel = None
+
+    def __eq__(self, other):
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, content=None, **kwargs):
+        await self.harness.api('dm')
+        self.harness.on_direct_message(self, content or '')
+
+
+class FakeRole:
+
+    def __init__(self, guild, name, position):
+        self.id = next(ids)
+        self.guild = guild
+        self.name = name
+        self.position = position
+        self.managed = False
+
+    def __str__(self):
+        return self.name
+
+    def __lt__(self, other):
+        return self.position < other.position
+
+    def __ge__(self, other):
+        return self.position >= other.position
+
+
+class FakeMember(FakeUser):
+
+    def __init__(self, harness, guild, name):
+        super().__init__(harness, name)
+        self.guild = guild
+        self.roles = [guild.default_role]
+
+    @property
+    def top_role(self):
+        return max(self.roles, key=lambda role: role.position)
+
+    def permissions_in(self, channel):
+        return discord.Permissions.all()
+
+    async def add_roles(self, *roles):
+        await self.harness.api('add_roles')
+        self.roles.extend(role for role in roles if role not in self.roles)
+
+    async def remove_roles(self, *roles):
+        await self.harness.api('remove_roles')
+        self.roles = [role for role in self.roles if role not in roles]
+
+    async def edit(self, nick=None):
+        await self.harness.api('edit_member')
+        self.display_name = nick or self.name
+
+
+class FakeGuild:
+
+    def __init__(self, harness, name, roles=20):
+        self.id = next(ids)
+        self.name = name
+        self.shard_id = 0
+        self.members = {}
+        self.default_role = None
+        self.roles = []
+        for position in range(roles):
+            self.roles.append(FakeRole(self, '@everyone' if not position else f'role {position}',
+                                       position))
+        self.default_role = self.roles[0]
+        self.me = FakeMember(harness, self, 'Jeopardy')
+        self.me.roles.append(self.roles[-1])
+
+    def __str__(self):
+        return self.name
+
+    def get_member(self, member_id):
+        return self.members.get(member_id)
+
+    def get_role(self, role_id):
+        for role in self.roles:
+            if role.id == role_id:
+                return role
+        return None
+
+
+class FakeMessage:
+
+    def __init__(self, harness, channel, author, content='', embed=None):
+        self.harness = harness
+        self._state = None
+        self.id = next(ids)
+        self.channel = channel
+        self.guild = getattr(channel, 'guild', None)
+        self.author = author
+        self.content = content
+        self.embed = embed
+        self.created_at = datetime.utcnow()
+
+    async def add_reaction(self, emoji):
+        await self.harness.api('add_reaction')
+        self.harness.on_bot_reaction(self, str(emoji))
+
+    async def remove_reaction(self, emoji, member):
+        await self.harness.api('remove_reaction')
+
+    async def clear_reactions(self):
+        await self.harness.api('clear_reactions')
+
+    async def delete(self):
+        await self.harness.api('delete_message')
+
+    async def edit(self, content=None, embed=None):
+        await self.harness.api('edit_message')
+        self.content = content
+
+
+class FakeReaction:
+
+    def __init__(self, message, emoji):
+        self.message = message
+        self.emoji = emoji
+
+
+class FakeRawReaction:
+
+    def __init__(self, message, user, emoji):
+        self.message_id = message.id
+        self.channel_id = message.channel.id
+        self.guild_id = message.guild.id
+        self.user_id = user.id
+        self.member = user
+        self.emoji = emoji
+
+
+class FakeChannel:
+
+    def __init__(self, harness, guild, name):
+        self.harness = harness
+        self.id = next(ids)
+        self.guild = guild
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, content=None, *, embed=None, delete_after=None):
+        await self.harness.api('send')
+        message = FakeMessage(self.harness, self, self.harness.bot.user, content or '', embed)
+        if delete_after is not None:
+            asyncio.get_event_loop().call_later(delete_after, self.harness.count, 'delete_message')
+        self.harness.on_bot_message(message)
+        return message
+
+    async def delete_messages(self, messages):
+        await self.harness.api('bulk_delete' if len(messages) > 1 else 'delete_message')
+
+    async def purge(self, limit=None, before=None):
+        await self.harness.api('purge')
+        return []
+
+    async def history(self, after=None, limit=None, oldest_first=False):
+        await self.harness.api('history')
+        return
+        yield
+
+
+class FakeContext:
+
+    def __init__(self, bot, channel, author, content=''):
+        self.bot = bot
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.me = channel.guild.me
+        self.message = FakeMessage(bot.harness, channel, author, content)
+        self.command = None
+        self.invoked_with = content.split(' ')[0]
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeJService(JServiceClient):
+    """The real client, breaker and all, with the network swapped for a corpus."""
+
+    def __init__(self, corpus, latency=0.0):
+        super().__init__(base_url='fake://')
+        self.corpus = corpus
+        self.latency = latency
+
+    async def fetch(self, path, params, endpoint):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        result = self.corpus.lookup(path, params)
+        metrics.increment('jservice_requests_total', endpoint=endpoint, status='fake')
+        return True, (json.dumps(result) if result is not None else None)
+
+
+class HarnessBot(commands.Bot):
+
+    def __init__(self, harness):
+        super().__init__(command_prefix='t.', intents=discord.Intents.default())
+        self.harness = harness
+        self.fake_user = FakeUser(harness, 'Jeopardy', bot=True)
+
+    @property
+    def user(self):
+        return self.fake_user
+
+    def get_channel(self, channel_id):
+        return self.harness.channels.get(channel_id)
+
+    def get_guild(self, guild_id):
+        return self.harness.guilds.get(guild_id)
+
+    def get_user(self, user_id):
+        return self.harness.users.get(user_id)
+
+
+class ChannelSimulation:
+
+    def __init__(self, channel, players):
+        self.channel = channel
+        self.players = players
+        self.clue_id = None
+        self.tried = set()
+        self.daily_double = False
+        self.waiting_since = None
+        self.clues = 0
+
+
+class Harness:
+
+    def __init__(self, args):
+        self.args = args
+        self.api_calls = collections.Counter()
+        self.channels = {}
+        self.guilds = {}
+        self.users = {}
+        self.simulations = {}
+        self.latencies = []
+        self.setup_times = []
+        self.errors = collections.Counter()
+        self.clues_played = 0
+        self.memory_samples = []
+        self.corpus = Corpus(synthetic_corpus(args.clues))
+        self.bot = None
+        self.game = None
+
+    def count(self, kind):
+        self.api_calls[kind] += 1
+
+    async def api(self, kind):
+        self.api_calls[kind] += 1
+        if self.args.api_latency:
+            await asyncio.sleep(self.args.api_latency)
+
+    def later(self, coroutine_function, *args):
+        """Runs a simulated user's reply after they've had time to think."""
+        async def reply():
+            await asyncio.sleep(random.uniform(self.args.think / 2, self.args.think))
+            try:
+                coroutine_function(*args)
+            except Exception as e:
+                self.errors[type(e).__name__] += 1
+        asyncio.ensure_future(reply())
+
+    def dispatch_message(self, simulation, author, content, channel=None):
+        simulation.waiting_since = time.perf_counter()
+        message = FakeMessage(self, channel or simulation.channel, author, content)
+        self.bot.dispatch('message', message)
+
+    def dispatch_reaction(self, simulation, message, user, emoji):
+        simulation.waiting_since = time.perf_counter()
+        self.bot.dispatch('reaction_add', FakeReaction(message, emoji), user)
+
+    def answer_for(self, simulation):
+        clue = self.corpus.clues.get(simulation.clue_id)
+        if clue is None or random.random() > self.args.correct:
+            return 'what is something else entirely'
+        return 'what is ' + clue['answer']
+
+    def leader(self, simulation):
+        game = self.game.get_channel(simulation.channel.id)['jeopardy']
+        return self.users.get(game.leader_id) or simulation.players[0]
+
+    # what the simulated players do when the bot says something
+
+    def on_bot_message(self, message):
+        simulation = self.simulations.get(message.channel.id)
+        if simulation is None:
+            return
+        if simulation.waiting_since is not None:
+            self.latencies.append(time.perf_counter() - simulation.waiting_since)
+            simulation.waiting_since = None
+        content = message.content
+        clue = question_re.search(content)
+        if clue:
+            simulation.clue_id = int(clue.group(2))
+            simulation.tried = set()
+            simulation.clues += 1
+            self.sample_memory()
+            if simulation.daily_double:
+                simulation.daily_double = False
+                self.later(self.dispatch_message, simulation, self.leader(simulation),
+                           self.answer_for(simulation))
+            elif self.args.mode in ('clue', 'infinite'):
+                self.later(self.dispatch_message, simulation, random.choice(simulation.players),
+                           self.answer_for(simulation))
+        elif content.endswith("what's your answer?"):
+            name = content[:-len(", what's your answer?")]
+            player = next((player for player in simulation.players if player.display_name == name),
+                          simulation.players[0])
+            self.later(self.dispatch_message, simulation, player, self.answer_for(simulation))
+        elif (content.startswith(("That's incorrect", "Be more specific")) and
+              'correct response' not in content and self.args.mode in ('clue', 'infinite')):
+            self.later(self.dispatch_message, simulation, random.choice(simulation.players),
+                       self.answer_for(simulation))
+        elif content.startswith("You've found one of the Daily Doubles!"):
+            simulation.daily_double = True
+            self.later(self.dispatch_message, simulation, self.leader(simulation), 'bet 5')
+
+    def sample_memory(self):
+        self.clues_played += 1
+        expected = self.args.channels * self.args.rounds
+        if tracemalloc.is_tracing() and self.clues_played % max(1, expected // 10) == 0:
+            # leave out what the harness itself keeps, like the latencies
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, __file__)])
+            self.memory_samples.append((self.clues_played,
+                                        sum(stat.size for stat in snapshot.statistics('filename'))))
+
+    def on_bot_reaction(self, message, emoji):
+        simulation = self.simulations.get(message.channel.id)
+        if simulation is None:
+            return
+        if emoji == '🔴':
+            untried = [player for player in simulation.players if player.id not in simulation.tried]
+            if not untried and self.args.mode == 'button':
+                # button mode only locks out whoever answered last
+                simulation.tried.clear()
+                untried = simulation.players
+            if untried:
+                player = random.choice(untried)
+                simulation.tried.add(player.id)
+                self.later(self.dispatch_reaction, simulation, message, player, '🔴')
+        elif emoji == '📋':
+            self.later(self.dispatch_reaction, simulation, message, self.leader(simulation), '⬇')
+        elif emoji == '🔄' and simulation.clues < self.args.rounds:
+            self.later(self.dispatch_reaction, simulation, message,
+                       random.choice(simulation.players), '🔄')
+
+    def on_direct_message(self, user, content):
+        if not self.args.final:
+            return
+        simulation = self.simulations.get(getattr(user, 'playing_in', None))
+        if simulation is None:
+            return
+        channel = discord.DMChannel.__new__(discord.DMChannel)
+        channel.id = user.id
+        clue = question_re.search(content)
+        if content.startswith('You have 30 seconds to `bet`'):
+            self.later(self.dispatch_message, simulation, user, 'bet 0', channel)
+        elif clue:
+            simulation.clue_id = int(clue.group(2))
+            self.later(self.dispatch_message, simulation, user, self.answer_for(simulation), channel)
+
+    # setting up the fake world
+
+    def make_guild(self, name):
+        guild = FakeGuild(self, name)
+        self.guilds[guild.id] = guild
+        return guild
+
+    def make_channel(self, guild, players=3):
+        channel = FakeChannel(self, guild, f'channel-{len(self.channels)}')
+        self.channels[channel.id] = channel
+        members = []
+        for i in range(players):
+            member = FakeMember(self, guild, f'player {channel.id}-{i}')
+            member.playing_in = channel.id
+            guild.members[member.id] = member
+            self.users[member.id] = member
+            members.append(member)
+        self.simulations[channel.id] = ChannelSimulation(channel, members)
+        return channel
+
+    async def setup(self):
+        from cogs.game import GameCog
+        from cogs.browser import BrowserCog
+        from cogs.role import RoleCog
+        from cogs.autodelete import AutoDeleteCog
+        from cogs.stats import StatsCog
+
+        self.bot = HarnessBot(self)
+        self.bot.jservice_client = FakeJService(self.corpus, self.args.jservice_latency)
+        self.game = GameCog(self.bot)
+        self.browser = BrowserCog(self.bot)
+        self.role = RoleCog(self.bot)
+        self.autodelete = AutoDeleteCog(self.bot)
+        self.stats = StatsCog(self.bot)
+        for cog in (self.game, self.browser, self.role, self.autodelete, self.stats):
+            self.bot.add_cog(cog)
+        await self.role.warm_up()
+
+    # scenarios
+
+    async def play_clues(self, channel):
+        simulation = self.simulations[channel.id]
+        settings = self.game.get_channel(channel.id)
+        settings['infinite mode'] = self.args.mode == 'infinite'
+        settings['button mode'] = self.args.mode == 'button'
+        settings['clean mode'] = self.args.clean
+        # in infinite mode the players keep it going with 🔄
+        for _ in range(1 if self.args.mode == 'infinite' else self.args.rounds):
+            player = random.choice(simulation.players)
+            ctx = FakeContext(self.bot, channel, player, 't.clue')
+            simulation.waiting_since = time.perf_counter()
+            await self.game.clue(ctx)
+            if random.random() < self.args.browse:
+                await self.browser.category(ctx, str(random.choice(self.corpus.category_order)))
+
+    async def play_jeopardy(self, channel):
+        simulation = self.simulations[channel.id]
+        for player in simulation.players:
+            await self.game.join(FakeContext(self.bot, channel, player, 't.jeopardy join'))
+        host = simulation.players[0]
+        setup_start = time.perf_counter()
+        if self.args.quickstart:
+            await self.game.quickstart(FakeContext(self.bot, channel, host, 't.jeopardy quickstart'))
+        else:
+            ctx = FakeContext(self.bot, channel, host, 't.jeopardy autofill')
+            await self.game.autofill(ctx)
+            await self.game.add_final(ctx)
+        self.setup_times.append(time.perf_counter() - setup_start)
+        ctx = FakeContext(self.bot, channel, host, 't.jeopardy start')
+        await self.game.start(ctx)
+        game = self.game.get_channel(channel.id)['jeopardy']
+        while game.active and game.game_round in (1, 2):
+            leader = self.users[game.leader_id]
+            offset = 0 if game.game_round == 1 else 6
+            remaining = [clue for category in game.clues[offset:offset+6] for clue in category
+                         if not clue.answered]
+            if not remaining:
+                break
+            clue = remaining[0]
+            ctx = FakeContext(self.bot, channel, leader, 't.take')
+            simulation.waiting_since = time.perf_counter()
+            await self.game.take(ctx, clue=f'{clue.category_id} {clue.value}')
+        if self.args.final and game.game_round == 3:
+            await self.game.final(FakeContext(self.bot, channel, host, 't.jeopardy final'))
+
+    async def join_members(self, guilds):
+        messages = {}
+        for guild in guilds:
+            role = guild.roles[1]
+            self.role.db_cursor.execute(f'INSERT INTO autoroles VALUES ({role.id}, {guild.id})')
+            channel = FakeChannel(self, guild, 'roles')
+            self.channels[channel.id] = channel
+            messages[guild.id] = message = FakeMessage(self, channel, self.bot.user)
+            self.role.reaction_roles[message.id] = {channel.id: guild.roles[2].id}
+        self.role.database.commit()
+        start = time.perf_counter()
+        for i in range(self.args.members):
+            guild = guilds[i % len(guilds)]
+            member = FakeMember(self, guild, f'member {i}')
+            guild.members[member.id] = member
+            self.bot.dispatch('member_join', member)
+            self.bot.dispatch('raw_reaction_add', FakeRawReaction(messages[guild.id], member,
+                                                                  random.choice('✅❎')))
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+        return time.perf_counter() - start
+
+    def start_autodelete(self, guild):
+        for i in range(self.args.autodelete):
+            channel = FakeChannel(self, guild, f'autodelete-{i}')
+            self.channels[channel.id] = channel
+            self.autodelete.channels[channel.id] = self.autodelete.waiters.spawn(
+                self.autodelete, self.autodelete.autodelete_task(channel, 3600), channel.id)
+
+    async def run(self):
+        await self.setup()
+        monitor = LoopMonitor(interval=0.05)
+        monitor.start()
+        rss_before = current_rss()
+
+        guilds = [self.make_guild(f'guild {i}') for i in range(max(1, self.args.channels // 50))]
+        channels = [self.make_channel(guilds[i % len(guilds)], self.args.players)
+                    for i in range(self.args.channels)]
+        self.start_autodelete(guilds[0])
+        if self.args.trace_memory:
+            tracemalloc.start()
+        if self.args.quickstart:
+            # a bot that has run for a while knows the whole corpus and has its boards ready
+            from cogs.cluestore import get_clue_store
+            get_clue_store().ingest_clues([self.corpus.clue_with_category(clue_id)
+                                           for clue_id in self.corpus.clue_order])
+            await self.game.top_up_boards.coro(self.game)
+
+        start = time.perf_counter()
+        join_time = await self.join_members(guilds)
+        scenario = self.play_jeopardy if self.args.mode == 'jeopardy' else self.play_clues
+        results = await asyncio.gather(*[scenario(channel) for channel in channels],
+                                       return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        # let clean mode finish deleting what the last clues left behind
+        await asyncio.gather(*[background.task for background in list(self.bot.waiters.tasks)
+                               if background.owner in ('GameCog', 'Deletions')], return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                self.errors[type(result).__name__] += 1
+        rss_after = current_rss()
+        pending = len(self.stats.player_stats.pending)
+        flush_start = time.perf_counter()
+        await self.stats.flush_events.coro(self.stats)
+        self.stats_flush = (pending, time.perf_counter() - flush_start)
+        tracemalloc.stop()
+
+        for task in list(self.autodelete.channels.values()):
+            task.cancel()
+        await asyncio.sleep(0)
+        monitor.stop()
+        self.report(elapsed, join_time, rss_before, rss_after, monitor)
+
+    def report(self, elapsed, join_time, rss_before, rss_after, monitor):
+        clues = sum(simulation.clues for simulation in self.simulations.values())
+        latencies = sorted(self.latencies) or [0.0]
+
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+        print(f'{self.args.channels} channels in {self.args.mode} mode, '
+              f'{self.args.players} players each, {elapsed:.1f}s')
+        print(f'clues played: {clues} ({clues / elapsed:.1f}/s)')
+        print(f'event handling latency: p50={percentile(0.5):.1f}ms p95={percentile(0.95):.1f}ms '
+              f'p99={percentile(0.99):.1f}ms max={latencies[-1] * 1000:.1f}ms '
+              f'over {len(self.latencies)} events')
+        if self.setup_times:
+            setup_times = sorted(self.setup_times)
+            print(f'board setup: p50={setup_times[len(setup_times) // 2] * 1000:.1f}ms '
+                  f'max={setup_times[-1] * 1000:.1f}ms')
+        print(f'{self.args.members} members joined and reacted in {join_time:.2f}s, '
+              f'{self.args.autodelete} autodelete channels running')
+        print(f'memory: {rss_before / 2**20:.1f}MB before, {rss_after / 2**20:.1f}MB after, '
+              f'{(rss_after - rss_before) / max(1, self.args.channels) / 1024:.1f}KB per channel, '
+              f'peak {peak_rss() / 2**20:.1f}MB')
+        if len(self.memory_samples) > 1:
+            (first_clues, first), (last_clues, last) = self.memory_samples[0], self.memory_samples[-1]
+            print(f'traced memory: {first / 2**20:.1f}MB after {first_clues} clues, '
+                  f'{last / 2**20:.1f}MB after {last_clues}, '
+                  f'{(last - first) / self.args.channels / 1024:.1f}KB more per channel')
+        print('discord API calls: ' + ', '.join(f'{kind}={amount}' for kind, amount
+                                                 in self.api_calls.most_common()))
+        if clues:
+            game_calls = sum(amount for kind, amount in self.api_calls.items()
+                             if kind not in ('add_roles', 'remove_roles', 'purge', 'history'))
+            print(f'discord API calls per clue: {game_calls / clues:.1f}')
+        print(monitor.report().rstrip())
+        pending, flush_time = self.stats_flush
+        guild_id = next(iter(self.channels.values())).guild.id
+        user_id = next(iter(self.simulations.values())).players[0].id
+        query_start = time.perf_counter()
+        for _ in range(100):
+            self.stats.player_stats.leaderboard(guild_id)
+            self.stats.player_stats.totals(guild_id, user_id)
+        query_time = (time.perf_counter() - query_start) / 100
+        print(f'player events: {pending} left to write at the end, written in {flush_time * 1000:.1f}ms, '
+              f'leaderboard and totals {query_time * 1000:.2f}ms')
+        print(self.bot.waiters.report().rstrip())
+        if self.errors:
+            print('errors: ' + ', '.join(f'{name}={amount}' for name, amount in self.errors.items()))
+
+
+async def check_breaker(slow_call=0.05):
+    """
+    One caller after another against a jservice slower than the breaker's
+    slow call limit, which never adds up to enough calls within the window,
+    has to open the breaker all the same.
+    """
+    client = FakeJService(Corpus(synthetic_corpus(100)), latency=slow_call * 1.5)
+    breaker = client.breaker
+    breaker.slow_call = slow_call
+    calls = 0
+    while breaker.allows_requests() and calls < breaker.minimum_calls:
+        await client.get_json(f'clues/{random.randint(1, 100)}.json')
+        calls += 1
+    if breaker.probe_task is not None:
+        breaker.probe_task.cancel()
+    assert not breaker.allows_requests(), f"the breaker is still {breaker.state} after {calls} slow calls"
+    assert calls == breaker.consecutive_failures, f"the breaker took {calls} slow calls to open"
+    print(f"breaker opened after {calls} slow calls one after another")
+
+
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return peak_rss()
+
+
+def peak_rss():
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate many channels playing at once.')
+    parser.add_argument('--channels', type=int, default=100)
+    parser.add_argument('--mode', choices=('clue', 'button', 'infinite', 'jeopardy'), default='clue')
+    parser.add_argument('--rounds', type=int, default=5,
+                        help='clues per channel in clue, button and infinite mode')
+    parser.add_argument('--players', type=int, default=3, help='players per channel')
+    parser.add_argument('--members', type=int, default=1000, help='members joining guilds')
+    parser.add_argument('--autodelete', type=int, default=100, help='autodelete channels')
+    parser.add_argument('--browse', type=float, default=0.1,
+                        help='chance a channel also looks up a category after a clue')
+    parser.add_argument('--clean', action='store_true', help='play clues in clean mode')
+    parser.add_argument('--quickstart', action='store_true',
+                        help='set up jeopardy boards from the pool instead of autofill')
+    parser.add_argument('--final', action='store_true', help='play Final Jeopardy! (70s each)')
+    parser.add_argument('--correct', type=float, default=0.8, help='chance an answer is right')
+    parser.add_argument('--think', type=float, default=0.1, help='longest a player takes to reply')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='seconds per Discord call')
+    parser.add_argument('--jservice-latency', type=float, default=0.0)
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='trace allocations to see how memory grows as clues are played')
+    parser.add_argument('--clues', type=int, default=CLUE_AMOUNT, help='size of the fake corpus')
+    parser.add_argument('--check-breaker', action='store_true',
+                        help='only check that a lone caller facing a slow jservice opens the breaker')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        # the cogs open database.db and clues.db in the working directory
+        os.chdir(directory)
+        asyncio.run(check_breaker() if args.check_breaker else Harness(args).run())